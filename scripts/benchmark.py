@@ -0,0 +1,130 @@
+"""Headless benchmarks of the dashboard data functions and page reruns.
+
+Every function and page is measured in a fresh python process, so the first call is a cold start (nothing cached),
+followed by warm calls over all the pokemon. Page reruns use streamlit's AppTest. Results are written as JSON.
+
+Usage:
+    python benchmark.py [--output bench.json] [--reruns 5] [--only NAME ...]
+"""
+import argparse
+import json
+import os
+import pathlib
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+SRC_PATH = pathlib.Path(__file__).parent.parent.absolute() / "src"
+PAGES = ["pokedex.py"] + sorted(str(path.relative_to(SRC_PATH)) for path in (SRC_PATH / "pages").glob("*.py"))
+FUNCTIONS = ["load_pokemon_dataframe", "get_df_with_umap", "pokemon_umap", "get_similarities", "pokemon_table",
+             "get_pokemon_evolution_line"]
+
+
+def _summary(times: list) -> dict:
+    """Returns statistics in milliseconds of a list of durations in seconds."""
+    times_ms = sorted(t * 1000 for t in times)
+    return {
+        "calls": len(times_ms),
+        "mean_ms": statistics.fmean(times_ms),
+        "p50_ms": times_ms[len(times_ms) // 2],
+        "p95_ms": times_ms[min(len(times_ms) - 1, int(len(times_ms) * 0.95))],
+        "max_ms": times_ms[-1],
+    }
+
+
+def _timed(function, *args, **kwargs) -> float:
+    start = time.perf_counter()
+    function(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def benchmark_function(name: str) -> dict:
+    """Times the import of utils, the first (cold) call of the function and warm calls over all the pokemon."""
+    start = time.perf_counter()
+    import utils
+    import_s = time.perf_counter() - start
+
+    names = utils.read_pokemon_dataframe(columns=("name",))["name"].tolist()
+    calls = {
+        "load_pokemon_dataframe": [((), {})] * len(names),
+        "get_df_with_umap": [((), {})] * len(names),
+        "pokemon_umap": [((), {"color_by": "pop-out", "pokedex_number": number})
+                         for number in range(1, len(names) + 1)] + [((), {"color_by": "type"})],
+        "get_similarities": [((pokemon_name,), {}) for pokemon_name in names],
+        "pokemon_table": [((pokemon_name,), {}) for pokemon_name in names],
+        "get_pokemon_evolution_line": [((pokemon_name,), {}) for pokemon_name in names],
+    }[name]
+    function = getattr(utils, name)
+
+    cold_s = _timed(function, *calls[0][0], **calls[0][1])
+    first_pass = [_timed(function, *args, **kwargs) for args, kwargs in calls]
+    cache_hit = [_timed(function, *args, **kwargs) for args, kwargs in calls]
+    return {"import_ms": import_s * 1000, "cold_ms": cold_s * 1000,
+            "first_pass": _summary(first_pass), "cache_hit": _summary(cache_hit)}
+
+
+def benchmark_page(page: str, reruns: int) -> dict:
+    """Times the first run of a page in a fresh process and then `reruns` reruns of the same session."""
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(str(SRC_PATH / page), default_timeout=600)
+    cold_s = _timed(app.run)
+    rerun_times = [_timed(app.run) for _ in range(reruns)]
+    return {"cold_ms": cold_s * 1000, "rerun": _summary(rerun_times),
+            "exceptions": [exception.message for exception in app.exception]}
+
+
+def _run_child(kind: str, name: str, reruns: int) -> dict:
+    """Runs one benchmark in a fresh python process and returns its JSON result."""
+    # The dashboard is run from the project root (streamlit run src/pokedex.py)
+    env = dict(os.environ, STREAMLIT_LOGGER_LEVEL="error", PYTHONWARNINGS="ignore")
+    result = subprocess.run([sys.executable, __file__, "--child", kind, name, "--reruns", str(reruns)],
+                            capture_output=True, text=True, env=env, cwd=SRC_PATH.parent)
+    if result.returncode != 0:
+        return {"error": result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "failed"}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default=None, help="JSON file to write the results to (default: stdout)")
+    parser.add_argument("--reruns", type=int, default=5, help="reruns of each page after the first run")
+    parser.add_argument("--only", nargs="*", default=None, help="functions or pages to benchmark")
+    parser.add_argument("--child", nargs=2, metavar=("KIND", "NAME"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(SRC_PATH))
+    if args.child is not None:
+        kind, name = args.child
+        result = benchmark_function(name) if kind == "function" else benchmark_page(name, args.reruns)
+        print(json.dumps(result))
+        return
+
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "functions": {},
+        "pages": {},
+    }
+    for name in FUNCTIONS:
+        if args.only is None or name in args.only:
+            print(f"Benchmarking {name}", file=sys.stderr)
+            results["functions"][name] = _run_child("function", name, args.reruns)
+    for page in PAGES:
+        if args.only is None or page in args.only:
+            print(f"Benchmarking {page}", file=sys.stderr)
+            results["pages"][page] = _run_child("page", page, args.reruns)
+
+    output = json.dumps(results, indent=4)
+    if args.output is None:
+        print(output)
+    else:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Compares the time the pokedex display functions spend preparing a pokemon before drawing it.
+
+"dataframe" is the preparation of `display_basic_info` and `display_base_stats_type_defenses` before PokemonRecord:
+a one-row dataframe from `PokemonIndex.row`, `.iloc[0]` field reads and a renamed, transposed stats frame. "record"
+is the current preparation from `get_pokemon_record`. Both produce the same fields and bars, and include the percentile
+annotations. Streamlit calls are left out, so only the preparation is measured.
+
+Usage:
+    python benchmark_render_prep.py [--repeats 5] [--output render_prep.json]
+"""
+import argparse
+import json
+import pathlib
+import platform
+import statistics
+import sys
+import time
+
+import pandas as pd
+
+# Make the dashboard modules importable
+sys.path.append(str(pathlib.Path(__file__).parent.parent.absolute() / "src"))
+
+from utils import get_pokemon_index, get_pokemon_record, get_stat_ranks, STAT_COLUMNS  # noqa: E402
+from displays import STAT_LABELS  # noqa: E402
+
+
+def prepare_dataframe(pokemon_index, stat_ranks, name: str) -> tuple:
+    """Prepares the pokemon as the display functions did from a one-row dataframe."""
+    match = pokemon_index.row(name)
+    id = match['pokedex_number'].iloc[0]
+    height = str(match['height_m'].iloc[0])
+    weight = str(match['weight_kg'].iloc[0])
+    type1 = match['type1'].iloc[0]
+    type2 = match['type2'].iloc[0]
+    type_number = 1 if pd.isnull(type2) else 2
+    abilities = match['abilities'].iloc[0]
+
+    df_stats = match[['hp', 'attack', 'defense', 'sp_attack', 'sp_defense', 'speed']]
+    df_stats = df_stats.rename(
+        columns={'hp': 'HP', 'attack': 'Attack', 'defense': 'Defense', 'sp_attack': 'Special Attack',
+                 'sp_defense': 'Special Defense', 'speed': 'Speed'}).T
+    df_stats.columns = ['stats']
+    number = int(match['pokedex_number'].iloc[0])
+    percentiles = stat_ranks.stat_percentiles(number, match['type1'].iloc[0])[:len(STAT_COLUMNS)]
+    text = [f'P{percentile:.0f}' for percentile in percentiles]
+    return id, height, weight, type1, type_number, abilities, df_stats.index, df_stats.stats, text
+
+
+def prepare_record(stat_ranks, name: str) -> tuple:
+    """Prepares the pokemon as the display functions do from its PokemonRecord."""
+    record = get_pokemon_record(name)
+    height = str(record.height_m)
+    weight = str(record.weight_kg)
+    type_number = 1 if record.type2 is None else 2
+    percentiles = stat_ranks.stat_percentiles(record.pokedex_number, record.type1)[:len(STAT_COLUMNS)]
+    text = [f'P{percentile:.0f}' for percentile in percentiles]
+    return (record.pokedex_number, height, weight, record.type1, type_number, record.abilities, STAT_LABELS,
+            record.stats, text)
+
+
+def time_calls(function, names: list, repeats: int) -> dict:
+    """Returns statistics in microseconds of the preparation of every pokemon, repeated."""
+    times = []
+    for _ in range(repeats):
+        for name in names:
+            start = time.perf_counter()
+            function(name)
+            times.append(time.perf_counter() - start)
+    times_us = sorted(t * 1e6 for t in times)
+    return {
+        "calls": len(times_us),
+        "mean_us": statistics.fmean(times_us),
+        "p50_us": times_us[len(times_us) // 2],
+        "p95_us": times_us[int(len(times_us) * 0.95)],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=5, help="passes over all the pokemon")
+    parser.add_argument("--output", default=None, help="JSON file to write the results to (default: stdout)")
+    args = parser.parse_args()
+
+    pokemon_index = get_pokemon_index()
+    stat_ranks = get_stat_ranks()
+    names = pokemon_index.names
+    # Build the caches before timing
+    prepare_dataframe(pokemon_index, stat_ranks, names[0])
+    prepare_record(stat_ranks, names[0])
+
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "dataframe": time_calls(lambda name: prepare_dataframe(pokemon_index, stat_ranks, name), names, args.repeats),
+        "record": time_calls(lambda name: prepare_record(stat_ranks, name), names, args.repeats),
+    }
+    results["speedup"] = results["dataframe"]["mean_us"] / results["record"]["mean_us"]
+    for path in ("dataframe", "record"):
+        print(f"{path:>9}: mean {results[path]['mean_us']:8.1f} us, p95 {results[path]['p95_us']:8.1f} us",
+              file=sys.stderr)
+    print(f"  speedup: {results['speedup']:.0f}x", file=sys.stderr)
+
+    output = json.dumps(results, indent=4)
+    if args.output is None:
+        print(output)
+    else:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
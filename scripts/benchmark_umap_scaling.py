@@ -0,0 +1,94 @@
+"""Compares the time of a full UMAP fit with the time of projecting appended rows, on synthetic datasets.
+
+Synthetic datasets are drawn from the real feature matrix (rows sampled with replacement plus gaussian noise), so
+they keep its structure. For every size, the scaler and UMAP are fitted on all the rows and then `--new-rows` extra
+rows are projected with the fitted model, as `build_umap_embedding` does when pokemon are appended to the csv.
+numba compiles the UMAP functions on first use, so a warm-up fit runs before the measurements. It is large enough
+(WARMUP_ROWS) for UMAP to use the approximate nearest-neighbor search of the larger datasets.
+
+Usage:
+    python benchmark_umap_scaling.py [--sizes 10000 25000 50000 100000] [--new-rows 1000] [--output umap.json]
+"""
+import argparse
+import json
+import pathlib
+import platform
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+# Make the dashboard modules importable
+sys.path.append(str(pathlib.Path(__file__).parent.parent.absolute() / "src"))
+
+from utils import get_feature_matrix, fit_umap_model, project_umap_embedding, UMAP_PARAMS  # noqa: E402
+
+SIZES = [10000, 25000, 50000, 100000]
+# Standard deviation of the noise, relative to the standard deviation of each feature
+NOISE = 0.05
+# UMAP switches from exact to approximate nearest neighbors above 4096 rows
+WARMUP_ROWS = 5000
+
+
+def synthetic_features(features: pd.DataFrame, n_rows: int, rng: np.random.Generator) -> pd.DataFrame:
+    """Returns n_rows sampled with replacement from the features, with gaussian noise added."""
+    values = features.to_numpy(dtype=np.float64)
+    rows = values[rng.integers(0, len(values), n_rows)]
+    rows += rng.normal(0, NOISE, rows.shape) * values.std(axis=0)
+    return pd.DataFrame(rows, columns=features.columns)
+
+
+def benchmark_size(features: pd.DataFrame, n_rows: int, n_new_rows: int, rng: np.random.Generator) -> dict:
+    data = synthetic_features(features, n_rows + n_new_rows, rng)
+    start = time.perf_counter()
+    model, _ = fit_umap_model(data.iloc[:n_rows])
+    fit_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    project_umap_embedding(model, data.iloc[n_rows:])
+    append_s = time.perf_counter() - start
+    return {"rows": n_rows, "new_rows": n_new_rows, "fit_s": fit_s, "append_s": append_s,
+            "speedup": fit_s / append_s}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="*", default=SIZES, help="rows of the fitted datasets")
+    parser.add_argument("--new-rows", type=int, default=1000, help="rows projected into each fitted model")
+    parser.add_argument("--output", default=None, help="JSON file to write the results to (default: stdout)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    features = get_feature_matrix()
+
+    print("Warming up numba", file=sys.stderr)
+    start = time.perf_counter()
+    benchmark_size(features, WARMUP_ROWS, 10, rng)
+    warmup_s = time.perf_counter() - start
+
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "umap_params": UMAP_PARAMS,
+        "warmup_s": warmup_s,
+        "sizes": [],
+    }
+    for n_rows in args.sizes:
+        print(f"Benchmarking {n_rows} rows", file=sys.stderr)
+        result = benchmark_size(features, n_rows, args.new_rows, rng)
+        print(f"{n_rows:>7} rows: fit {result['fit_s']:8.2f} s, append {args.new_rows} rows "
+              f"{result['append_s']:6.2f} s ({result['speedup']:.0f}x)", file=sys.stderr)
+        results["sizes"].append(result)
+
+    output = json.dumps(results, indent=4)
+    if args.output is None:
+        print(output)
+    else:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""Builds every derived data artifact of the dashboard, rebuilding only what is outdated.
+
+The artifacts form a dependency graph:
+
+    typed_data -> embedding -> neighbors
+               -> evolution_index
+    thumbnails
+
+The key of a stage is the sha256 of its input files (including the outputs of the stages it depends on) and its
+parameters. Keys are recorded in data/build_state.json, and a stage only runs if its key changed or one of its
+outputs is missing. Stages whose dependencies are built run in parallel in a process pool.
+
+Usage:
+    python build.py [--force] [--dry-run] [--workers N] [--only STAGE ...]
+"""
+import argparse
+import hashlib
+import json
+import os
+import pathlib
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+PROJECT_PATH = pathlib.Path(__file__).parent.parent.absolute()
+# Make the dashboard modules importable (also in the worker processes)
+sys.path.append(str(PROJECT_PATH / "src"))
+
+import utils  # noqa: E402
+
+STATE_FILE = "data/build_state.json"
+THUMBNAIL_FORMAT = "webp"
+
+STAGES = {
+    "typed_data": {
+        "deps": [],
+        "inputs": [utils.POKEMON_CSV_FILE],
+        "params": {},
+        "outputs": [utils.POKEMON_TYPED_FILE],
+    },
+    "embedding": {
+        "deps": ["typed_data"],
+        "inputs": [utils.POKEMON_CSV_FILE],
+        "params": utils.UMAP_PARAMS,
+        "outputs": [utils.UMAP_EMBEDDING_FILE, utils.UMAP_METADATA_FILE, utils.UMAP_MODEL_FILE],
+    },
+    "neighbors": {
+        "deps": ["embedding"],
+        "inputs": [utils.UMAP_EMBEDDING_FILE],
+        "params": {},
+        "outputs": [utils.NEIGHBORS_FILE],
+    },
+    "evolution_index": {
+        "deps": ["typed_data"],
+        "inputs": [utils.POKEMON_CSV_FILE, utils.EVOLUTIONS_CSV_FILE],
+        "params": {},
+        "outputs": [utils.EVOLUTION_INDEX_FILE],
+    },
+    "thumbnails": {
+        "deps": [],
+        "inputs": ["images/[0-9][0-9][0-9].png"],
+        "params": {"sizes": list(utils.THUMBNAIL_SIZES), "format": THUMBNAIL_FORMAT},
+        "outputs": [utils.THUMBNAIL_DIR + "/manifest.json"],
+    },
+}
+
+
+def run_stage(name: str, force: bool) -> bool:
+    """Runs the builder of a stage in a worker process. Returns whether it rewrote its outputs."""
+    if name == "typed_data":
+        return utils.build_typed_data(force=force)
+    if name == "embedding":
+        return utils.build_umap_embedding(force=force)
+    if name == "neighbors":
+        return utils.build_neighbor_index(force=force)
+    if name == "evolution_index":
+        return utils.build_evolution_index(force=force)
+    if name == "thumbnails":
+        return utils.build_thumbnails(sizes=utils.THUMBNAIL_SIZES, image_format=THUMBNAIL_FORMAT, force=force) > 0
+    raise ValueError(f"Unknown stage {name}")
+
+
+def stage_key(name: str) -> str:
+    """Returns the sha256 of the stage name, its parameters and the content of its input files."""
+    stage = STAGES[name]
+    sha = hashlib.sha256()
+    sha.update(json.dumps({"stage": name, "params": stage["params"]}, sort_keys=True).encode())
+    for pattern in stage["inputs"]:
+        for path in sorted(PROJECT_PATH.glob(pattern)):
+            sha.update(str(path.relative_to(PROJECT_PATH)).encode())
+            sha.update(hashlib.sha256(path.read_bytes()).digest())
+    return sha.hexdigest()
+
+
+def is_up_to_date(name: str, state: dict) -> bool:
+    outputs_exist = all((PROJECT_PATH / output).exists() for output in STAGES[name]["outputs"])
+    return outputs_exist and state.get(name) == stage_key(name)
+
+
+def load_state() -> dict:
+    try:
+        with open(PROJECT_PATH / STATE_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(state: dict):
+    tmp_path = PROJECT_PATH / (STATE_FILE + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(dict(sorted(state.items())), f, indent=4)
+    os.replace(tmp_path, PROJECT_PATH / STATE_FILE)
+
+
+def with_dependencies(names: list) -> list:
+    """Returns the given stages and all the stages they depend on."""
+    selected = set()
+    pending = list(names)
+    while pending:
+        name = pending.pop()
+        if name not in selected:
+            selected.add(name)
+            pending.extend(STAGES[name]["deps"])
+    return [name for name in STAGES if name in selected]
+
+
+def build(names: list = None, force: bool = False, workers: int = None, dry_run: bool = False) -> dict:
+    """Runs the outdated stages in dependency order, independent stages in parallel.
+
+    Args:
+        names (list, optional): Stages to build, together with their dependencies. Defaults to all of them.
+        force (bool, optional): Rebuild every selected stage. Defaults to False.
+        workers (int, optional): Size of the process pool. Defaults to the number of CPUs.
+        dry_run (bool, optional): Only report which stages are outdated. Defaults to False.
+
+    Returns:
+        dict: "built", "unchanged" (ran but its outputs were up to date) and "skipped" stage names.
+    """
+    selected = with_dependencies(names or list(STAGES))
+    state = load_state()
+    result = {"built": [], "unchanged": [], "skipped": []}
+    done = set()
+    running = {}
+    started = {}
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while len(done) < len(selected):
+            for name in selected:
+                if name in done or name in running.values():
+                    continue
+                if not all(dep in done for dep in STAGES[name]["deps"]):
+                    continue
+                # Dependencies are built, so the inputs of the stage are final
+                if not force and is_up_to_date(name, state):
+                    result["skipped"].append(name)
+                    done.add(name)
+                elif dry_run:
+                    print(f"{name} is outdated")
+                    result["built"].append(name)
+                    done.add(name)
+                else:
+                    print(f"Building {name}")
+                    running[executor.submit(run_stage, name, force)] = name
+                    started[name] = time.perf_counter()
+            if not running:
+                continue
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                rebuilt = future.result()
+                result["built" if rebuilt else "unchanged"].append(name)
+                state[name] = stage_key(name)
+                save_state(state)
+                done.add(name)
+                print(f"{'Built' if rebuilt else 'Checked'} {name} in {time.perf_counter() - started[name]:.1f} s")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--force", action="store_true", help="rebuild every stage")
+    parser.add_argument("--dry-run", action="store_true", help="only print the outdated stages")
+    parser.add_argument("--workers", type=int, default=None, help="size of the process pool")
+    parser.add_argument("--only", nargs="*", choices=list(STAGES), default=None,
+                        help="stages to build, together with their dependencies")
+    args = parser.parse_args()
+
+    result = build(args.only, args.force, args.workers, args.dry_run)
+    print(f"Built {len(result['built'])}, unchanged {len(result['unchanged'])}, "
+          f"up to date {len(result['skipped'])}")
+
+
+if __name__ == "__main__":
+    main()
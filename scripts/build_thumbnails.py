@@ -0,0 +1,12 @@
+import pathlib
+import sys
+
+# Make the dashboard modules importable
+sys.path.append(str(pathlib.Path(__file__).parent.parent.absolute() / "src"))
+
+from utils import build_thumbnails, THUMBNAIL_DIR
+
+# Write 64, 128 and 256 px variants of every image (pass --png to store them as png instead of webp)
+image_format = "png" if "--png" in sys.argv else "webp"
+converted = build_thumbnails(image_format=image_format, force="--force" in sys.argv)
+print(f"Converted {converted} images to {THUMBNAIL_DIR}")
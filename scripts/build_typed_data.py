@@ -0,0 +1,13 @@
+import pathlib
+import sys
+
+# Make the dashboard modules importable
+sys.path.append(str(pathlib.Path(__file__).parent.parent.absolute() / "src"))
+
+from utils import build_typed_data, POKEMON_TYPED_FILE
+
+# Convert pokemon.csv to a typed parquet file (categorical types, int16 stats, float32 multipliers, parsed abilities)
+if build_typed_data(force="--force" in sys.argv):
+    print("Saved typed pokemon data to " + POKEMON_TYPED_FILE)
+else:
+    print("Typed pokemon data is up to date")
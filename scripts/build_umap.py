@@ -0,0 +1,14 @@
+import pathlib
+import sys
+
+# Make the dashboard modules importable
+sys.path.append(str(pathlib.Path(__file__).parent.parent.absolute() / "src"))
+
+from utils import build_umap_embedding, UMAP_EMBEDDING_FILE
+
+# Compute the UMAP embedding once and store it in the data folder next to pokemon.csv
+force = "--force" in sys.argv
+if build_umap_embedding(force=force):
+    print("Saved UMAP embedding to " + UMAP_EMBEDDING_FILE)
+else:
+    print("UMAP embedding is up to date")
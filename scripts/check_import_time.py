@@ -0,0 +1,59 @@
+"""Checks the import time of the modules the main page imports, using python -X importtime.
+
+Fails if importing them takes longer than the budget or pulls in one of the heavy modules that must only be
+imported lazily (umap and numba, sklearn, pynndescent).
+
+Usage:
+    python check_import_time.py [--budget SECONDS] [--top N]
+"""
+import argparse
+import pathlib
+import subprocess
+import sys
+
+SRC_PATH = pathlib.Path(__file__).parent.parent.absolute() / "src"
+# Modules imported by pokedex.py
+MAIN_PAGE_MODULES = ["utils", "displays", "instrumentation"]
+# Modules that must not be imported at startup
+LAZY_MODULES = ["umap", "numba", "sklearn", "pynndescent", "plotly.express", "st_aggrid"]
+BUDGET_S = 3.0
+
+
+def measure_imports(modules: list) -> dict:
+    """Returns the cumulative import time in seconds of every module imported by the given ones."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + ", ".join(modules)],
+                            capture_output=True, text=True, cwd=SRC_PATH)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative_us) / 1e6
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget", type=float, default=BUDGET_S, help="maximum import time in seconds")
+    parser.add_argument("--top", type=int, default=10, help="number of slowest top-level packages to print")
+    args = parser.parse_args()
+
+    times = measure_imports(MAIN_PAGE_MODULES)
+    total = sum(times[module] for module in MAIN_PAGE_MODULES if module in times)
+    top_level = {name: seconds for name, seconds in times.items() if "." not in name}
+    for name, seconds in sorted(top_level.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"{seconds:8.3f} s  {name}")
+    print(f"{total:8.3f} s  total ({', '.join(MAIN_PAGE_MODULES)}), budget {args.budget:.3f} s")
+
+    errors = [f"{module} is imported at startup" for module in LAZY_MODULES if module in times]
+    if total > args.budget:
+        errors.append(f"import time {total:.3f} s is over the budget of {args.budget:.3f} s")
+    for error in errors:
+        print("ERROR: " + error, file=sys.stderr)
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
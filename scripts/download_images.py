@@ -1,16 +1,152 @@
-import requests
+"""Downloads the pokemon images to the images folder.
+
+Downloads run concurrently over a pooled HTTP session. Every image is retried with exponential backoff (client errors
+other than 429 are not retried), validated as a PNG and written atomically, and its sha256 is recorded in
+images/checksums.json. Failed images are reported and the other downloads go on. Images that already match the
+checksum manifest are skipped, so an interrupted run can be resumed by running the script again.
+
+Usage:
+    python download_images.py [--base-url URL] [--workers 8] [--retries 4] [--first 1] [--last 801]
+"""
+import argparse
+import hashlib
+import json
 import os
+import pathlib
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+
+BASE_URL = "https://assets.pokemon.com/assets/cms2/img/pokedex/full/"
+IMAGES_PATH = pathlib.Path(__file__).parent.parent.absolute() / "images"
+MANIFEST_FILE = "checksums.json"
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# Save the manifest every this many downloads, so an interrupted run keeps its progress
+SAVE_EVERY = 50
+
+
+def load_manifest(images_path: pathlib.Path) -> dict:
+    """Returns the checksum manifest, a dictionary from file name to sha256."""
+    try:
+        with open(images_path / MANIFEST_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_atomically(path: pathlib.Path, content: bytes):
+    """Writes to a temporary file in the same folder and renames it, so the file is never left half-written."""
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def save_manifest(images_path: pathlib.Path, manifest: dict):
+    write_atomically(images_path / MANIFEST_FILE, json.dumps(dict(sorted(manifest.items())), indent=4).encode())
+
+
+def is_up_to_date(path: pathlib.Path, checksum: str) -> bool:
+    """Returns whether the file exists and matches the checksum."""
+    return checksum is not None and path.exists() and hashlib.sha256(path.read_bytes()).hexdigest() == checksum
+
+
+def create_session(workers: int) -> requests.Session:
+    """Returns a session whose connection pool fits one connection per worker."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def is_permanent(error: Exception) -> bool:
+    """Returns whether the download error will not go away by retrying: a client error other than 429."""
+    response = getattr(error, "response", None)
+    status_code = getattr(response, "status_code", None)
+    return status_code is not None and 400 <= status_code < 500 and status_code != 429
+
+
+def download(session: requests.Session, url: str, path: pathlib.Path, retries: int, backoff: float) -> str:
+    """Downloads a PNG to the path, retrying transient errors with exponential backoff. Returns its sha256."""
+    for attempt in range(retries + 1):
+        try:
+            response = session.get(url, timeout=30)
+            response.raise_for_status()
+            if not response.content.startswith(PNG_SIGNATURE):
+                raise ValueError(f"{url} is not a PNG image")
+            write_atomically(path, response.content)
+            return hashlib.sha256(response.content).hexdigest()
+        except (requests.RequestException, ValueError) as error:
+            if attempt == retries or is_permanent(error):
+                raise
+            time.sleep(backoff * 2 ** attempt)
+
+
+def download_images(base_url: str = BASE_URL, images_path: pathlib.Path = IMAGES_PATH, first: int = 1,
+                    last: int = 801, workers: int = 8, retries: int = 4, backoff: float = 0.5) -> dict:
+    """Downloads the images of pokedex numbers first..last that are missing or do not match the manifest.
+
+    Returns:
+        dict: counts of "downloaded", "skipped" and "failed" images.
+    """
+    images_path.mkdir(parents=True, exist_ok=True)
+    manifest = load_manifest(images_path)
+    file_names = [str(i).zfill(3) + ".png" for i in range(first, last + 1)]
+    pending = [name for name in file_names if not is_up_to_date(images_path / name, manifest.get(name))]
+    counts = {"downloaded": 0, "skipped": len(file_names) - len(pending), "failed": 0}
+
+    lock = threading.Lock()
+    session = create_session(workers)
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(download, session, base_url + name, images_path / name, retries, backoff): name
+                       for name in pending}
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    checksum = future.result()
+                except (requests.RequestException, ValueError, OSError) as error:
+                    counts["failed"] += 1
+                    print(f"Failed {name}: {error}")
+                    continue
+                with lock:
+                    manifest[name] = checksum
+                    counts["downloaded"] += 1
+                    if counts["downloaded"] % SAVE_EVERY == 0:
+                        save_manifest(images_path, manifest)
+                print("Downloaded " + name)
+    finally:
+        session.close()
+        save_manifest(images_path, manifest)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default=BASE_URL, help="url the image file names are appended to")
+    parser.add_argument("--images-path", type=pathlib.Path, default=IMAGES_PATH, help="folder to save the images to")
+    parser.add_argument("--workers", type=int, default=8, help="concurrent downloads")
+    parser.add_argument("--retries", type=int, default=4, help="retries of each image")
+    parser.add_argument("--backoff", type=float, default=0.5, help="seconds before the first retry, doubled each time")
+    parser.add_argument("--first", type=int, default=1, help="first pokedex number")
+    parser.add_argument("--last", type=int, default=801, help="last pokedex number")
+    args = parser.parse_args()
 
-# Create a directory to store the images
-os.makedirs('../images/', exist_ok=True)
+    counts = download_images(args.base_url, args.images_path, args.first, args.last, args.workers, args.retries,
+                             args.backoff)
+    print(f"Downloaded {counts['downloaded']}, skipped {counts['skipped']}, failed {counts['failed']}")
+    if counts["failed"]:
+        raise SystemExit(1)
 
-# Change the working directory to the images directory
-os.chdir('../images/')
 
-# Download the images
-for i in range(1, 802):
-    url = 'https://assets.pokemon.com/assets/cms2/img/pokedex/full/' + str(i).zfill(3) + '.png'
-    r = requests.get(url)
-    with open(str(i).zfill(3) + '.png', 'wb') as f:
-        f.write(r.content)
-    print('Downloaded ' + str(i).zfill(3) + '.png')
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""Publishes the numeric matrices of the dashboard for multi-worker deployments.
+
+Writes the stats, type effectiveness, UMAP embedding and neighbor tables as .npy files to a directory that every
+streamlit worker memory-maps read-only, so the workers share one copy of the pages and skip building them. Run it
+before starting the workers (and again after the data changes), and start the workers with
+POKEDEX_SHARED_DATA_DIR set to the same directory:
+
+    python publish_shared_data.py --dir /dev/shm/pokedex
+    POKEDEX_SHARED_DATA_DIR=/dev/shm/pokedex streamlit run src/pokedex.py --server.port 8501
+    POKEDEX_SHARED_DATA_DIR=/dev/shm/pokedex streamlit run src/pokedex.py --server.port 8502
+
+Workers ignore the directory if the published matrices do not match their pokemon csv or UMAP parameters.
+
+Usage:
+    python publish_shared_data.py [--dir /dev/shm/pokedex]
+"""
+import argparse
+import pathlib
+import sys
+
+# Make the dashboard modules importable
+sys.path.append(str(pathlib.Path(__file__).parent.parent.absolute() / "src"))
+
+from utils import publish_shared_data  # noqa: E402
+
+DEFAULT_DIR = "/dev/shm/pokedex"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dir", default=DEFAULT_DIR, help="directory to publish to, preferably on a tmpfs")
+    args = parser.parse_args()
+
+    manifest = publish_shared_data(args.dir)
+    for name, matrix in manifest["matrices"].items():
+        print(f"Published {name} {tuple(matrix['shape'])} {matrix['dtype']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,35 @@
 import pandas as pd
 import numpy as np
+import json
 import streamlit as st
 import plotly.graph_objects as go
 
-from st_aggrid import AgGrid, GridUpdateMode, GridOptionsBuilder, JsCode, AgGridReturn
-from utils import get_pokemon_image
+from utils import (get_pokemon_image_source, get_type_effectiveness, get_facet_index, get_stat_ranks,
+                   POKEMON_TYPES, STAT_COLUMNS)
+from instrumentation import instrument, get_stats
 
+# Labels of the base stats, in the order of STAT_COLUMNS
+STAT_LABELS = ['HP', 'Attack', 'Defense', 'Special Attack', 'Special Defense', 'Speed']
 
-def display_basic_info(match):
+
+@instrument
+def display_basic_info(record, image_size=None):
     """Display basic info of a Pokemon, including name, id, image, type, height, weight, abilities.
 
+    record is the PokemonRecord of the pokemon. image_size is the width the image is rendered at, used to pick the
+    smallest adequate thumbnail (None for the full-size image).
+
     Code adapted from: https://betterprogramming.pub/build-your-own-pokedex-web-app-with-streamlit-10c550a98e22
     """
     # get basic info data
-    name = match['name'].iloc[0]
-    id = match['pokedex_number'].iloc[0]
-    height = str(match['height_m'].iloc[0])
-    weight = str(match['weight_kg'].iloc[0])
-    type1 = match['type1'].iloc[0]
-    type2 = match['type2'].iloc[0]
-    type_number = 1 if pd.isnull(type2) else 2
-    abilities = match['abilities'].iloc[0].replace(']', '').replace('[', '').replace("'", '').split(', ')
+    name = record.name
+    id = record.pokedex_number
+    height = str(record.height_m)
+    weight = str(record.weight_kg)
+    type1 = record.type1
+    type2 = record.type2
+    type_number = 1 if type2 is None else 2
+    abilities = record.abilities
     ability1 = abilities[0] if len(abilities) > 0 else ''
     ability2 = abilities[1] if len(abilities) > 1 else ''
     ability_hidden = abilities[2] if len(abilities) > 2 else ''
@@ -30,7 +39,7 @@ def display_basic_info(match):
 
     # leftmost column col1 displays pokemon image
     try:
-        image = get_pokemon_image(id)
+        image = get_pokemon_image_source(id, size=image_size)
         col1.image(image)
     except Exception:  # output 'Image not available' instead of crashing the program when image not found
         col1.write('Image not available.')
@@ -59,8 +68,79 @@ def display_basic_info(match):
             col3.subheader(ability_hidden + ' (Hidden)')
 
 
-def display_table(data) -> AgGridReturn:
-    """https://discuss.streamlit.io/t/ag-grid-get-column-index-of-clicked-cell/32576"""
+@instrument
+def display_filters():
+    """Displays the filter panel in the sidebar and returns the boolean mask of the pokemon that match it.
+
+    The filters are kept in the session state, so every page shows and applies the same ones. Returns None when no
+    filter is set.
+    """
+    facet_index = get_facet_index()
+    filters = st.session_state.setdefault("filters", {})
+    legendary_options = {"All": None, "Only legendary": True, "Not legendary": False}
+    stat_ranges = {stat: facet_index.stat_range(stat) for stat in STAT_COLUMNS + ["base_total"]}
+
+    # Streamlit drops the state of widgets that are not shown, so it is restored from the filters on every page
+    widget_values = {
+        "filter_type1": filters.get("type1", []),
+        "filter_type2": filters.get("type2", []),
+        "filter_generations": filters.get("generations", []),
+        "filter_legendary": {value: label for label, value in legendary_options.items()}[filters.get("legendary")],
+        **{"filter_" + stat: filters.get("stat_ranges", {}).get(stat, stat_range)
+           for stat, stat_range in stat_ranges.items()},
+    }
+    for key, value in widget_values.items():
+        if key not in st.session_state:
+            st.session_state[key] = value
+
+    with st.sidebar.expander("Filters", expanded=bool(filters)):
+        type1 = st.multiselect("Primary type", POKEMON_TYPES, key="filter_type1")
+        type2 = st.multiselect("Secondary type", POKEMON_TYPES, key="filter_type2")
+        generations = st.multiselect("Generation", sorted(facet_index.bitsets["generation"]), key="filter_generations")
+        legendary = st.radio("Legendary", legendary_options, horizontal=True, key="filter_legendary")
+        selected_ranges = {}
+        for stat, stat_range in stat_ranges.items():
+            value = st.slider(stat.replace("_", " ").title(), *stat_range, key="filter_" + stat)
+            if tuple(value) != stat_range:
+                selected_ranges[stat] = tuple(value)
+
+    filters = {"type1": type1, "type2": type2, "generations": generations,
+               "legendary": legendary_options[legendary], "stat_ranges": selected_ranges}
+    filters = {facet: value for facet, value in filters.items() if value not in (None, [], {})}
+    st.session_state["filters"] = filters
+    return facet_index.filter(**filters) if filters else None
+
+
+def filter_names(names: list, mask) -> list:
+    """Returns the names of the pokemon kept by the filter mask, all of them if the mask is None or empty.
+
+    If the selected pokemon is filtered out, the first pokemon that matches the filters is selected instead.
+    """
+    if mask is None:
+        return names
+    filtered_names = [name for name, keep in zip(names, mask) if keep]
+    if len(filtered_names) == 0:
+        st.sidebar.warning("No Pokemon matches the filters.")
+        return names
+    if st.session_state.get("selected_pokemon") not in filtered_names:
+        st.session_state["selected_pokemon"] = filtered_names[0]
+    return filtered_names
+
+
+@instrument
+def display_table(data, key=None):
+    """Displays a selectable grid of the given rows and returns the grid response.
+
+    Only the rows passed are sent to the browser, so callers page large tables (see the Similar Pokemon page) and
+    round values beforehand. With a key, the grid keeps its state between reruns and its arguments stay identical
+    when only the selection changes, so streamlit does not send the rows again. The selection is part of that state,
+    so callers change the key together with the rows.
+
+    https://discuss.streamlit.io/t/ag-grid-get-column-index-of-clicked-cell/32576
+    """
+    # only the Similar Pokemon page uses the grid, so the main page does not import it
+    from st_aggrid import AgGrid, GridUpdateMode, GridOptionsBuilder, JsCode
+
     gb = GridOptionsBuilder.from_dataframe(data)
     gb.configure_columns(list('abc'), editable=True)
 
@@ -80,13 +160,10 @@ def display_table(data) -> AgGridReturn:
     gb.configure_selection(selection_mode='single')
     go = gb.build()
 
-    # Round to 4 decimal places
-    data["similarity"] = data["similarity"].apply(lambda x: round(x, 4))
-
     return_ag = AgGrid(data,
                        gridOptions=go,
                        allow_unsafe_jscode=True,
-                       reload_data=True,
+                       key=key,
                        update_mode=GridUpdateMode.SELECTION_CHANGED,
                        fit_columns_on_grid_load=True,
                        height=500,
@@ -95,91 +172,69 @@ def display_table(data) -> AgGridReturn:
     return return_ag
 
 
-def display_base_stats_type_defenses(match, compare_match=None):
-    """Displays base stats and type defenses of a Pokemon.
+@instrument
+def display_base_stats_type_defenses(record, compare_record=None):
+    """Displays base stats and type defenses of a Pokemon, given its PokemonRecord.
 
     Code adapted from: https://betterprogramming.pub/build-your-own-pokedex-web-app-with-streamlit-10c550a98e22
     """
-    # list to gather all type weaknesses and resistances
-    weakness_2_types = []
-    weakness_4_types = []
-    resistance_half_types = []
-    resistance_quarter_types = []
-
-    # dataset only shows damage (x4, x2, x0.25, x0.5) of each type towards the Pokemon
-    # manually classify the damages into weaknesses and resistances list
-    for i, j in match.iterrows():
-        for column, value in j.items():
-            if column.startswith('against_'):
-                type_ = column.split('_')[1]
-                if value == 0.5:
-                    resistance_half_types.append(type_)
-                elif value == 0.25:
-                    resistance_quarter_types.append(type_)
-                elif value == 2:
-                    weakness_2_types.append(type_)
-                elif value == 4:
-                    weakness_4_types.append(type_)
+    # types grouped by the damage they deal to the Pokemon (x4, x2, x0.5, x0.25, x0)
+    defenses = get_type_effectiveness().defenses([record.pokedex_number])[0]
+    stat_ranks = get_stat_ranks()
 
     with st.container():
         col1, col2 = st.columns(2)
 
         # left column col1 displays horizontal bar chart of base stats
         col1.subheader('Base Stats')
-        # with col1.container():
-            # compare_match = st.selectbox("Compare with", [None] + pokemon_df["name"].values.tolist())
-            # compare_match = pokemon_df[pokemon_df["name"] == compare_match] if compare_match is not None else None
-
-        # get base stats of Pokemon and rename columns nicely
-        df_stats = match[['hp', 'attack', 'defense', 'sp_attack', 'sp_defense', 'speed']]
-        df_stats = df_stats.rename(
-            columns={'hp': 'HP', 'attack': 'Attack', 'defense': 'Defense', 'sp_attack': 'Special Attack',
-                     'sp_defense': 'Special Defense', 'speed': 'Speed'}).T
-        df_stats.columns = ['stats']
-
-        # plot horizontal bar chart using matplotlib.pyplot
+        cohort_labels = {'all': 'All Pokemon', 'type': 'Same type', 'generation': 'Generation'}
+        cohort = col1.radio('Percentiles among', list(cohort_labels), format_func=cohort_labels.get,
+                            horizontal=True)
+
+        def percentile_text(pokemon):
+            """Returns the percentile annotations of the six stats of the pokemon in the selected cohort."""
+            # the type cohort is every pokemon with the primary type of this one, in either of its type slots
+            pokemon_cohort = pokemon.type1 if cohort == 'type' else cohort
+            percentiles = stat_ranks.stat_percentiles(pokemon.pokedex_number, pokemon_cohort)[:len(STAT_COLUMNS)]
+            return [f'P{percentile:.0f}' for percentile in percentiles]
+
+        # plot horizontal bar chart of the base stats
         fig = go.Figure()
-        if compare_match is not None:
-            df_compare_stats = compare_match[['hp', 'attack', 'defense', 'sp_attack', 'sp_defense', 'speed']]
-            df_compare_stats = df_compare_stats.rename(
-                columns={'hp': 'HP', 'attack': 'Attack', 'defense': 'Defense', 'sp_attack': 'Special Attack',
-                            'sp_defense': 'Special Defense', 'speed': 'Speed'}).T
-            df_compare_stats.columns = ['stats']
-            df_stats['compare_stats'] = df_compare_stats['stats']
-
-            # Create a grouped bar chart that compares the stats of match and compare_match
+        if compare_record is not None:
+            # Create a grouped bar chart that compares the stats of record and compare_record
 
             # set width of bar
             bar_width = 0.4
-            # set height of bar
-            bars1 = df_stats['stats']
-            bars2 = df_stats['compare_stats']
             # Set position of bar on X axis
-            r1 = np.arange(len(bars1))
+            r1 = np.arange(len(STAT_LABELS))
             r2 = [x + bar_width for x in r1]
             # Make the plot
-            pokemon_name = match['name'].values[0]
-            pokemon_name_compare = compare_match['name'].values[0]
             fig.add_trace(go.Bar(
                 y=r2,
-                x=bars1,
+                x=record.stats,
                 orientation='h',
-                name=pokemon_name
+                name=record.name,
+                text=percentile_text(record),
+                textposition='outside',
+                cliponaxis=False
             ))
 
             fig.add_trace(go.Bar(
                 y=r1,
-                x=bars2,
+                x=compare_record.stats,
                 orientation='h',
-                name=pokemon_name_compare,
-                marker=dict(color='gray')
+                name=compare_record.name,
+                marker=dict(color='gray'),
+                text=percentile_text(compare_record),
+                textposition='outside',
+                cliponaxis=False
             ))
 
             fig.update_layout(
                 yaxis=dict(
                     tickmode='array',
-                    tickvals=[r + bar_width / 2 for r in range(len(bars1))],
-                    ticktext=df_stats.index
+                    tickvals=[r + bar_width / 2 for r in range(len(STAT_LABELS))],
+                    ticktext=STAT_LABELS
                 ),
                 legend=dict(
                     orientation='h',
@@ -192,14 +247,13 @@ def display_base_stats_type_defenses(match, compare_match=None):
 
         else:
             fig.add_trace(go.Bar(
-                y=df_stats.index,
-                x=df_stats.stats,
-                orientation='h'
+                y=STAT_LABELS,
+                x=record.stats,
+                orientation='h',
+                text=percentile_text(record),
+                textposition='outside',
+                cliponaxis=False
             ))
-            #
-            # fig.update_layout(
-            #     title='Pokemon Stats'
-            # )
         fig.update_layout(xaxis_range=[0, 250])
         # plt.xlim([0, 250])
         # col1.pyplot(fig)
@@ -208,26 +262,36 @@ def display_base_stats_type_defenses(match, compare_match=None):
         # the displayed types are nicely formatted using css (same as earlier)
         col2.subheader('Type Defenses')
 
-        col2.write('Strong Weaknesses (x4)')
-        weakness_text = ''
-        for type_ in weakness_4_types:
-            weakness_text += f' <span class="icon type-{type_}">{type_}</span>'
-        col2.markdown(weakness_text, unsafe_allow_html=True)
-
-        col2.write('Weaknesses (x2)')
-        weakness_text = ''
-        for type_ in weakness_2_types:
-            weakness_text += f' <span class="icon type-{type_}">{type_}</span>'
-        col2.markdown(weakness_text, unsafe_allow_html=True)
-
-        col2.write('Resistances (x0.5)')
-        resistance_half_text = ''
-        for type_ in resistance_half_types:
-            resistance_half_text += f' <span class="icon type-{type_}">{type_}</span>'
-        col2.markdown(resistance_half_text, unsafe_allow_html=True)
-
-        col2.write('Strong Resistances (x0.25)')
-        resistance_quarter_text = ''
-        for type_ in resistance_quarter_types:
-            resistance_quarter_text += f' <span class="icon type-{type_}">{type_}</span>'
-        col2.markdown(resistance_quarter_text, unsafe_allow_html=True)
+        defense_labels = {4: 'Strong Weaknesses (x4)', 2: 'Weaknesses (x2)', 0.5: 'Resistances (x0.5)',
+                          0.25: 'Strong Resistances (x0.25)', 0: 'Immunities (x0)'}
+        for multiplier, label in defense_labels.items():
+            col2.write(label)
+            types_text = ''
+            for type_ in defenses[multiplier]:
+                types_text += f' <span class="icon type-{type_}">{type_}</span>'
+            col2.markdown(types_text, unsafe_allow_html=True)
+
+
+def display_diagnostics():
+    """Displays the statistics recorded by the instrumentation: per function and for the latest reruns."""
+    stats = get_stats()
+    st.title('Diagnostics')
+    if not stats['enabled']:
+        st.write('Instrumentation is disabled. Set POKEDEX_INSTRUMENTATION=1 to enable it.')
+        return
+
+    st.subheader('Functions')
+    functions = pd.DataFrame.from_dict(stats['functions'], orient='index')
+    if not functions.empty:
+        functions['total_ms'] = functions['total_s'] * 1000
+        functions['max_ms'] = functions['max_s'] * 1000
+        functions = functions[['calls', 'hits', 'misses', 'mean_ms', 'max_ms', 'total_ms', 'payload_bytes']]
+        st.dataframe(functions.sort_values('total_ms', ascending=False), use_container_width=True)
+
+    st.subheader('Latest reruns')
+    for rerun in reversed(stats['reruns'][-20:]):
+        # time of the top-level instrumented calls, the per-function times include the functions they call
+        total_ms = 1000 * rerun['total_s']
+        with st.expander(f"{rerun['page']} - session {str(rerun['session'])[:8]} - {total_ms:.1f} ms"):
+            st.dataframe(pd.DataFrame.from_dict(rerun['functions'], orient='index'), use_container_width=True)
+    st.download_button('Download JSON', data=json.dumps(stats, indent=4), file_name='instrumentation.json')
@@ -0,0 +1,124 @@
+"""Static file server for the pokemon images, so browsers cache them instead of receiving them on every rerun.
+
+Set the environment variable POKEDEX_IMAGE_SERVER=1 to enable it. The pages then reference images by URL and the
+browser downloads each one once: URLs carry a content hash (`?v=...`), and responses have a one year
+`Cache-Control: immutable` header and an ETag, so revalidations are answered with 304 Not Modified.
+
+Every streamlit process starts the server on the same port; when the port is taken (another worker already serves
+the images), the process reuses that server.
+
+Optional environment variables:
+    POKEDEX_IMAGE_SERVER_PORT: port of the server (default: 8600).
+    POKEDEX_IMAGE_BASE_URL: URL the browser reaches the server at, e.g. behind a reverse proxy
+        (default: http://<host of the dashboard>:<port>/).
+"""
+import hashlib
+import http.server
+import mimetypes
+import os
+import pathlib
+import threading
+import urllib.parse
+
+from streamlit.logger import get_logger
+
+ENABLED = os.environ.get("POKEDEX_IMAGE_SERVER", "0").lower() not in ("", "0", "false", "no")
+PORT = int(os.environ.get("POKEDEX_IMAGE_SERVER_PORT", "8600"))
+BASE_URL = os.environ.get("POKEDEX_IMAGE_BASE_URL")
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+SUFFIXES = (".png", ".webp")
+
+logger = get_logger(__name__)
+
+_lock = threading.Lock()
+_server = None
+
+
+class ImageRequestHandler(http.server.BaseHTTPRequestHandler):
+    """Serves the image files under `root`, with cache headers and ETags."""
+
+    root = None
+    # (path, modification time, size) -> ETag
+    etags = {}
+
+    def _resolve(self):
+        relative_path = urllib.parse.unquote(urllib.parse.urlsplit(self.path).path).lstrip("/")
+        path = (self.root / relative_path).resolve()
+        if self.root not in path.parents or path.suffix not in SUFFIXES or not path.is_file():
+            return None
+        return path
+
+    def _etag(self, path: pathlib.Path, stat: os.stat_result) -> str:
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        etag = self.etags.get(key)
+        if etag is None:
+            etag = '"' + hashlib.sha256(path.read_bytes()).hexdigest()[:32] + '"'
+            self.etags[key] = etag
+        return etag
+
+    def _send_headers(self):
+        path = self._resolve()
+        if path is None:
+            self.send_error(404)
+            return None
+        stat = path.stat()
+        etag = self._etag(path, stat)
+        if etag in self.headers.get("If-None-Match", ""):
+            self.send_response(304)
+            path = None
+        else:
+            self.send_response(200)
+            self.send_header("Content-Type", mimetypes.guess_type(path.name)[0] or "application/octet-stream")
+            self.send_header("Content-Length", str(stat.st_size))
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", CACHE_CONTROL)
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        return path
+
+    def do_HEAD(self):
+        self._send_headers()
+
+    def do_GET(self):
+        path = self._send_headers()
+        if path is not None:
+            with open(path, "rb") as f:
+                self.wfile.write(f.read())
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+
+def start(root: pathlib.Path):
+    """Starts the server of the files under root in a daemon thread, once per process."""
+    global _server
+    with _lock:
+        if _server is not None:
+            return
+        ImageRequestHandler.root = pathlib.Path(root).resolve()
+        try:
+            _server = http.server.ThreadingHTTPServer(("", PORT), ImageRequestHandler)
+        except OSError:  # port taken, most likely by the server of another worker
+            logger.info("Port %d is in use, using the image server already running on it", PORT)
+            _server = False
+            return
+        threading.Thread(target=_server.serve_forever, name="image-server", daemon=True).start()
+        logger.info("Serving images on port %d", PORT)
+
+
+def _base_url() -> str:
+    if BASE_URL:
+        return BASE_URL.rstrip("/") + "/"
+    host = "localhost"
+    try:
+        import streamlit as st
+        host = urllib.parse.urlsplit("//" + st.context.headers.get("Host", host)).hostname or host
+    except Exception:  # outside a streamlit session
+        pass
+    return f"http://{host}:{PORT}/"
+
+
+def url(relative_path: str, version: str = None) -> str:
+    """Returns the URL of a file relative to the served root, versioned so it can be cached forever."""
+    query = f"?v={version}" if version else ""
+    return _base_url() + urllib.parse.quote(relative_path) + query
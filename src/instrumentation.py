@@ -0,0 +1,189 @@
+"""Opt-in timing and cache instrumentation of the dashboard hot paths.
+
+Set the environment variable POKEDEX_INSTRUMENTATION=1 to enable it. When it is not set, `instrument` returns the
+decorated function unchanged (or just wrapped by the streamlit cache), so it adds no overhead.
+
+Optional environment variables:
+    POKEDEX_INSTRUMENTATION_FILE: JSON file the statistics are periodically written to (default: the log).
+    POKEDEX_INSTRUMENTATION_INTERVAL: seconds between two dumps (default: 60).
+"""
+import collections
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from streamlit.logger import get_logger
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+ENABLED = os.environ.get("POKEDEX_INSTRUMENTATION", "0").lower() not in ("", "0", "false", "no")
+DUMP_FILE = os.environ.get("POKEDEX_INSTRUMENTATION_FILE")
+DUMP_INTERVAL = float(os.environ.get("POKEDEX_INSTRUMENTATION_INTERVAL", "60"))
+# Number of reruns kept in memory
+MAX_RERUNS = 200
+
+logger = get_logger(__name__)
+
+_lock = threading.Lock()
+_local = threading.local()
+_functions = collections.defaultdict(lambda: {"calls": 0, "hits": 0, "misses": 0, "total_s": 0.0, "max_s": 0.0,
+                                              "payload_bytes": 0})
+_reruns = collections.deque(maxlen=MAX_RERUNS)
+_current_reruns = {}
+_dump_thread = None
+
+
+def _payload_size(value, seen: set = None) -> int:
+    """Returns an estimate in bytes of the size of a returned value, including the objects it references.
+
+    Containers and the attributes of plain objects (e.g. the index classes) are measured recursively, counting every
+    object once.
+    """
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(np.sum(value.memory_usage(index=True, deep=True)))
+    if isinstance(value, pd.Index):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if hasattr(value, "getbands") and hasattr(value, "size"):  # PIL image
+        return value.size[0] * value.size[1] * len(value.getbands())
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        return size + sum(_payload_size(key, seen) + _payload_size(item, seen) for key, item in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return size + sum(_payload_size(item, seen) for item in value)
+    if isinstance(value, (str, bytes, int, float, bool, type(None))):
+        return size
+    attributes = getattr(value, "__dict__", {})
+    slots = [slot for cls in type(value).__mro__ for slot in getattr(cls, "__slots__", ())]
+    size += _payload_size(attributes, seen) if attributes else 0
+    return size + sum(_payload_size(getattr(value, slot), seen) for slot in slots if hasattr(value, slot))
+
+
+def _session_id():
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else None
+
+
+def _record(name: str, elapsed: float, payload: int, miss, top_level: bool):
+    with _lock:
+        stats = _functions[name]
+        stats["calls"] += 1
+        stats["total_s"] += elapsed
+        stats["max_s"] = max(stats["max_s"], elapsed)
+        stats["payload_bytes"] += payload
+        if miss is not None:
+            stats["misses" if miss else "hits"] += 1
+
+        rerun = _current_reruns.get(_session_id())
+        if rerun is not None:
+            rerun_stats = rerun["functions"].setdefault(name, {"calls": 0, "misses": 0, "total_s": 0.0})
+            rerun_stats["calls"] += 1
+            rerun_stats["misses"] += int(bool(miss))
+            rerun_stats["total_s"] += elapsed
+            # Nested calls are part of the time of the call they are made from
+            if top_level:
+                rerun["total_s"] += elapsed
+
+
+def instrument(func=None, *, cache=None):
+    """Records call counts, wall time, payload size and cache hits/misses of the decorated function.
+
+    Use `@instrument` for plain functions and `@instrument(cache=st.cache_data)` in place of a streamlit cache
+    decorator, which is then also counted as hit or miss.
+    """
+    if func is None:
+        return functools.partial(instrument, cache=cache)
+    if not ENABLED:
+        return func if cache is None else cache(func)
+
+    name = f"{func.__module__}.{func.__qualname__}"
+    if cache is not None:
+        @functools.wraps(func)
+        def on_miss(*args, **kwargs):
+            # Only runs on a cache miss: flag the call on top of the stack
+            _local.stack[-1] = True
+            return func(*args, **kwargs)
+        target = cache(on_miss)
+    else:
+        target = func
+
+    # Cache hits of st.cache_resource return the same object, which is only measured once
+    last_payload = {"value": None, "size": 0}
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not hasattr(_local, "stack"):
+            _local.stack = []
+        _local.stack.append(False)
+        start = time.perf_counter()
+        try:
+            value = target(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            miss = _local.stack.pop()
+        if value is not last_payload["value"]:
+            last_payload.update(value=value, size=_payload_size(value))
+        _record(name, elapsed, last_payload["size"], miss if cache is not None else None, not _local.stack)
+        return value
+
+    if hasattr(target, "clear"):
+        wrapper.clear = target.clear
+    _start_dump_thread()
+    return wrapper
+
+
+def start_rerun(page: str):
+    """Starts a new rerun of the current session: calls recorded from now on are grouped under it."""
+    if not ENABLED:
+        return
+    session_id = _session_id()
+    rerun = {"session": session_id, "page": page, "started": time.time(), "total_s": 0.0, "functions": {}}
+    with _lock:
+        _current_reruns[session_id] = rerun
+        _reruns.append(rerun)
+
+
+def get_stats() -> dict:
+    """Returns a copy of the per-function and per-rerun statistics."""
+    with _lock:
+        functions = {name: dict(stats, mean_ms=1000 * stats["total_s"] / stats["calls"] if stats["calls"] else 0.0)
+                     for name, stats in _functions.items()}
+        reruns = [dict(rerun, functions={name: dict(stats) for name, stats in rerun["functions"].items()})
+                  for rerun in _reruns]
+    return {"enabled": ENABLED, "timestamp": time.time(), "functions": functions, "reruns": reruns}
+
+
+def dump_stats():
+    """Writes the statistics to POKEDEX_INSTRUMENTATION_FILE, or to the log if it is not set."""
+    stats = get_stats()
+    if DUMP_FILE:
+        with open(DUMP_FILE, "w") as f:
+            json.dump(stats, f, indent=4)
+    else:
+        logger.info("instrumentation %s", json.dumps(stats["functions"]))
+
+
+def _dump_periodically():
+    while True:
+        time.sleep(DUMP_INTERVAL)
+        try:
+            dump_stats()
+        except OSError:
+            logger.exception("Could not dump the instrumentation statistics")
+
+
+def _start_dump_thread():
+    global _dump_thread
+    with _lock:
+        if _dump_thread is None:
+            _dump_thread = threading.Thread(target=_dump_periodically, name="instrumentation-dump", daemon=True)
+            _dump_thread.start()
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils import load_pokemon_dataframe, POKEMON_TYPES, AGAINST_COLUMNS
+from instrumentation import instrument
+
+
+# Damage bonus of an attack of one of the attacker's own types (same-type attack bonus)
+STAB = 1.5
+
+
+class MatchupMatrix:
+    """Expected damage of every pokemon attacking every other pokemon, as a float32 matrix.
+
+    `damage[i, j]` is the damage pokemon i deals to pokemon j with its best same-type attack: the STAB bonus, times
+    the best multiplier of i's types against j (the `against_*` columns), times the best of the physical
+    (attack / defense) and special (sp_attack / sp_defense) stat ratios. A neutral hit between equal stats scores 1.5.
+    """
+
+    def __init__(self, pokemon_df: pd.DataFrame):
+        type_positions = {type_: i for i, type_ in enumerate(POKEMON_TYPES)}
+        type1 = pokemon_df["type1"].astype(str).map(type_positions).to_numpy()
+        # Single-type pokemon attack with their first type only
+        type2 = pokemon_df["type2"].astype(object).map(type_positions).fillna(pd.Series(type1)).to_numpy(dtype=int)
+        effectiveness = pokemon_df[AGAINST_COLUMNS].to_numpy(dtype=np.float32)
+        stats = {stat: pokemon_df[stat].to_numpy(dtype=np.float32)
+                 for stat in ("attack", "defense", "sp_attack", "sp_defense")}
+
+        # effectiveness[j, t] is the multiplier of type t against defender j, transposed to (attacker, defender)
+        multipliers = np.maximum(effectiveness[:, type1], effectiveness[:, type2]).T
+        ratios = np.maximum(stats["attack"][:, np.newaxis] / stats["defense"][np.newaxis, :],
+                            stats["sp_attack"][:, np.newaxis] / stats["sp_defense"][np.newaxis, :])
+        self.damage = (STAB * multipliers * ratios).astype(np.float32)
+
+        self.positions = {name: i for i, name in enumerate(pokemon_df["name"].values)}
+        self.table = pokemon_df[["pokedex_number", "name", "type1", "type2"]].rename(
+            {"pokedex_number": "#"}, axis=1).reset_index(drop=True)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def _top(self, name: str, scores: np.ndarray, k: int, mask: np.ndarray) -> pd.DataFrame:
+        """Returns the k pokemon with the highest scores (the queried one excluded), with the damage both ways."""
+        i = self.positions[name]
+        candidates = np.flatnonzero(mask) if mask is not None else np.arange(len(self))
+        candidates = candidates[candidates != i]
+        if k < len(candidates):
+            candidates = candidates[np.argpartition(-scores[candidates], k)[:k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+
+        df = self.table.take(candidates)
+        df["damage dealt"] = np.round(self.damage[candidates, i].astype(np.float64), 2)
+        df["damage taken"] = np.round(self.damage[i, candidates].astype(np.float64), 2)
+        return df
+
+    def targets(self, name: str, k: int = 10, mask: np.ndarray = None) -> pd.DataFrame:
+        """Returns the k pokemon the given one deals the most damage to.
+
+        "damage dealt" and "damage taken" are from the point of view of the returned pokemon.
+
+        Args:
+            name (str): name of the attacking pokemon.
+            k (int, optional): number of rows to return. Defaults to 10.
+            mask (np.ndarray, optional): boolean mask of the pokemon rows that can be returned (see FacetIndex).
+                Defaults to None (all of them).
+        """
+        return self._top(name, self.damage[self.positions[name]], k, mask)
+
+    def threats(self, name: str, k: int = 10, mask: np.ndarray = None) -> pd.DataFrame:
+        """Returns the k pokemon that deal the most damage to the given one. See `targets` for the arguments."""
+        return self._top(name, self.damage[:, self.positions[name]], k, mask)
+
+    def counters(self, name: str, k: int = 10, mask: np.ndarray = None) -> pd.DataFrame:
+        """Returns the k pokemon with the largest advantage over the given one: damage dealt minus damage taken.
+
+        See `targets` for the arguments.
+        """
+        i = self.positions[name]
+        return self._top(name, self.damage[:, i] - self.damage[i], k, mask)
+
+
+@instrument(cache=st.cache_resource)
+def get_matchup_matrix() -> MatchupMatrix:
+    """Returns the damage matchup matrix of every pokemon against every pokemon. Built once per process."""
+    columns = ("pokedex_number", "name", "type1", "type2", "attack", "defense", "sp_attack", "sp_defense",
+               *AGAINST_COLUMNS)
+    return MatchupMatrix(load_pokemon_dataframe(columns=columns))
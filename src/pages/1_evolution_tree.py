@@ -1,12 +1,18 @@
 import streamlit as st
 
-from utils import (load_pokemon_dataframe,
-                   get_pokedex_number,
-                   get_pokemon_image,
+from utils import (get_pokemon_index,
+                   get_pokemon_image_source,
                    get_unevolved,
                    get_first_evolved,
                    get_second_evolved,
                    )
+from displays import display_filters, filter_names
+import instrumentation
+
+instrumentation.start_rerun("evolution_tree")
+
+# Width in pixels of the images in each column
+IMAGE_SIZE = 256
 
 # Initialization
 if "selected_pokemon" not in st.session_state:
@@ -14,18 +20,16 @@ if "selected_pokemon" not in st.session_state:
 
 st.markdown("<h1 style='text-align: center;'>Evolution Tree</h1>", unsafe_allow_html=True)
 
-pokemon_df = load_pokemon_dataframe()
+pokemon_index = get_pokemon_index(columns=("pokedex_number", "name"))
 
 with st.sidebar:
+    names = filter_names(pokemon_index.names, display_filters())
     last_selected_pokemon = st.session_state["selected_pokemon"]
     st.session_state["selected_pokemon"] = st.selectbox("Select a Pokemon",
-                                                        pokemon_df["name"].values,
-                                                        index=int(get_pokedex_number(
-                                                            pokemon_df,
-                                                            st.session_state["selected_pokemon"])
-                                                        ) - 1)
+                                                        names,
+                                                        index=names.index(st.session_state["selected_pokemon"]))
     if last_selected_pokemon != st.session_state["selected_pokemon"]:
-        st.experimental_rerun()
+        st.rerun()
 
 col1, col2, col3 = st.columns(3)
 
@@ -33,7 +37,7 @@ try:
     # Write Unevolved in bold and centered
     col1.markdown("<h2 style='text-align: center;'>Unevolved</h2>", unsafe_allow_html=True)
     pokemon = get_unevolved(st.session_state["selected_pokemon"])
-    image = get_pokemon_image(get_pokedex_number(pokemon_df, pokemon))
+    image = get_pokemon_image_source(pokemon_index.number(pokemon), size=IMAGE_SIZE)
     col1.image(image)
     col1.markdown(f'<p style="text-align: center;">{pokemon}</p>', unsafe_allow_html=True)
 except Exception:  # output 'Image not available' instead of crashing the program when image not found
@@ -47,7 +51,7 @@ try:
     else:
         for pokemon in first_evolved:
             try:
-                image = get_pokemon_image(get_pokedex_number(pokemon_df, pokemon))
+                image = get_pokemon_image_source(pokemon_index.number(pokemon), size=IMAGE_SIZE)
                 col2.image(image)
                 col2.markdown(f'<p style="text-align: center;">{pokemon}</p>', unsafe_allow_html=True)
             except Exception:
@@ -63,7 +67,7 @@ try:
     else:
         for pokemon in second_evolved:
             try:
-                image = get_pokemon_image(get_pokedex_number(pokemon_df, pokemon))
+                image = get_pokemon_image_source(pokemon_index.number(pokemon), size=IMAGE_SIZE)
                 col3.image(image)
                 col3.markdown(f'<p style="text-align: center;">{pokemon}</p>', unsafe_allow_html=True)
             except Exception:
@@ -1,13 +1,19 @@
 import streamlit as st
+import pandas as pd
 import pathlib
 
-from utils import (load_pokemon_dataframe,
-                   get_pokedex_number,
+from utils import (get_pokemon_index,
+                   get_pokemon_record,
                    pokemon_umap,
                    pokemon_table,
+                   SIMILARITY_METRICS,
+                   FEATURE_WEIGHT_GROUPS,
                    )
 
-from displays import display_basic_info, display_table
+from displays import display_basic_info, display_table, display_filters, filter_names
+import instrumentation
+
+instrumentation.start_rerun("similar_pokemon")
 
 current_path = pathlib.Path(__file__).parent.parent.absolute()
 with open(current_path / "style.css") as f:
@@ -16,45 +22,87 @@ with open(current_path / "style.css") as f:
 
 st.markdown("<h1 style='text-align: center;'>Similar Pokemon</h1>", unsafe_allow_html=True)
 
+# Number of similar pokemon per page of the table, only the current page is sent to the grid
+SIMILAR_PAGE_SIZE = 20
+METRIC_LABELS = {
+    "umap": "UMAP distance",
+    "cosine": "Cosine (features)",
+    "euclidean": "Euclidean (features)",
+    "weighted": "Weighted euclidean (features)",
+}
+
 # Initialization
 if "selected_pokemon" not in st.session_state:
     st.session_state["selected_pokemon"] = "Bulbasaur"
+if "similar_page" not in st.session_state:
+    st.session_state["similar_page"] = 0
+# Part of the key of the grid, changed with its rows so the grid does not return the selection of the previous rows
+if "similar_table_version" not in st.session_state:
+    st.session_state["similar_table_version"] = 0
+
+
+def change_page(step):
+    st.session_state["similar_page"] += step
+    st.session_state["similar_table_version"] += 1
+
 
 with st.sidebar:
-    pokemon_df = load_pokemon_dataframe()
+    pokemon_index = get_pokemon_index(columns=("pokedex_number", "name"))
+    mask = display_filters()
+    names = filter_names(pokemon_index.names, mask)
+    if len(names) == len(pokemon_index):
+        mask = None
     last_selected_pokemon = st.session_state["selected_pokemon"]
     st.session_state["selected_pokemon"] = st.selectbox("Select a Pokemon",
-                                                        pokemon_df["name"].values,
+                                                        names,
                                                         # label_visibility="hidden",
-                                                        index=int(get_pokedex_number(
-                                                            pokemon_df,
-                                                            st.session_state["selected_pokemon"])
-                                                        ) - 1)
+                                                        index=names.index(st.session_state["selected_pokemon"]))
     if last_selected_pokemon != st.session_state["selected_pokemon"]:
-        st.experimental_rerun()
+        st.rerun()
     mode = st.radio("Color points by:", ["type", "pop-out"], index=0)
+    metric = st.selectbox("Similarity metric", SIMILARITY_METRICS, format_func=METRIC_LABELS.get)
+    weights = None
+    if metric == "weighted":
+        with st.expander("Feature weights", expanded=True):
+            weights = {group: st.slider(group, min_value=0.0, max_value=5.0, value=1.0, step=0.5)
+                       for group in FEATURE_WEIGHT_GROUPS}
+
+# A new query starts on the first page
+query = (st.session_state["selected_pokemon"], metric, str(st.session_state["filters"]))
+if st.session_state.get("similar_query") != query:
+    st.session_state["similar_query"] = query
+    st.session_state["similar_page"] = 0
+    st.session_state["similar_table_version"] += 1
 
 
-display_basic_info(pokemon_df[pokemon_df["name"] == st.session_state["selected_pokemon"]])
+display_basic_info(get_pokemon_record(st.session_state["selected_pokemon"]), image_size=256)
 
 col1, col2 = st.columns(2, gap="large")
 with col1:
     # Choose between "type" and "pop-out"
     st.subheader("Pokemon Embeddings (UMAP)")
-    fig = pokemon_umap(color_by=mode, pokedex_number=get_pokedex_number(pokemon_df,
-                                                                        st.session_state["selected_pokemon"]))
+    fig = pokemon_umap(color_by=mode, pokedex_number=pokemon_index.number(st.session_state["selected_pokemon"]),
+                       mask=mask)
     st.plotly_chart(fig, use_container_width=True)
 
 with col2:
     # Table
     st.subheader("Similar Pokemon")
-    df = pokemon_table(pokemon_df, pokemon_name=st.session_state["selected_pokemon"])
+    page = st.session_state["similar_page"]
+    n_pages = max(1, -(-len(names) // SIMILAR_PAGE_SIZE))
+    df = pokemon_table(st.session_state["selected_pokemon"], k=SIMILAR_PAGE_SIZE, metric=metric, weights=weights,
+                       start=page * SIMILAR_PAGE_SIZE, mask=mask)
     st.write("Click on a row to select a Pokemon.")
-    response = display_table(df)
-    try:
-        last_selected_pokemon = st.session_state["selected_pokemon"]
-        st.session_state["selected_pokemon"] = response.selected_rows[0]["name"]
-        if last_selected_pokemon != st.session_state["selected_pokemon"]:
-            st.experimental_rerun()
-    except IndexError:
-        pass
\ No newline at end of file
+    response = display_table(df, key=f"similar_table_{st.session_state['similar_table_version']}")
+    col_previous, col_page, col_next = st.columns([1, 2, 1])
+    col_previous.button("Previous", on_click=change_page, args=(-1,), disabled=page == 0)
+    col_page.write(f"Page {page + 1} of {n_pages}")
+    col_next.button("Next", on_click=change_page, args=(1,), disabled=page == n_pages - 1)
+    # selected_rows is None when nothing is selected, a dataframe in recent st_aggrid versions and a list of dicts
+    # in older ones
+    rows = response.selected_rows
+    if rows is not None and len(rows) > 0:
+        selected_pokemon = rows.iloc[0]["name"] if isinstance(rows, pd.DataFrame) else rows[0]["name"]
+        if selected_pokemon != st.session_state["selected_pokemon"]:
+            st.session_state["selected_pokemon"] = selected_pokemon
+            st.rerun()
\ No newline at end of file
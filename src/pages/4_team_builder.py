@@ -0,0 +1,48 @@
+import streamlit as st
+import pathlib
+
+from utils import get_pokemon_index
+from team import suggest_team, team_coverage, TEAM_SIZE
+import instrumentation
+
+instrumentation.start_rerun("team_builder")
+
+current_path = pathlib.Path(__file__).parent.parent.absolute()
+with open(current_path / "style.css") as f:
+    st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
+
+st.markdown("<h1 style='text-align: center;'>Team Builder</h1>", unsafe_allow_html=True)
+
+# Initialization
+if "selected_pokemon" not in st.session_state:
+    st.session_state["selected_pokemon"] = "Bulbasaur"
+if "team" not in st.session_state:
+    st.session_state["team"] = [st.session_state["selected_pokemon"]]
+
+pokemon_index = get_pokemon_index(columns=("pokedex_number", "name"))
+
+with st.sidebar:
+    st.session_state["team"] = st.multiselect("Team", pokemon_index.names, default=st.session_state["team"],
+                                              max_selections=TEAM_SIZE)
+    n_suggestions = st.slider("Number of suggestions", min_value=1, max_value=20, value=5)
+    allow_legendary = st.checkbox("Allow legendary Pokemon", value=False)
+
+st.write("Suggested members minimize the weaknesses shared by the team and maximize the number of types that at "
+         "least one member resists.")
+
+team = st.session_state["team"]
+if len(team) < TEAM_SIZE:
+    st.subheader("Suggestions")
+    suggestions = suggest_team(team, n_suggestions=n_suggestions, allow_legendary=allow_legendary)
+    st.dataframe(suggestions, use_container_width=True, hide_index=True)
+
+if len(team) > 0:
+    st.subheader("Type Coverage")
+    coverage = team_coverage(team)
+    coverage_text = ''
+    for type_, weak, resist in coverage.itertuples(index=False):
+        if weak > 0 and resist == 0:
+            coverage_text += f' <span class="icon type-{type_}">{type_}</span>'
+    st.write("Types the team is weak to and nobody resists")
+    st.markdown(coverage_text, unsafe_allow_html=True)
+    st.dataframe(coverage.set_index("type").T, use_container_width=True)
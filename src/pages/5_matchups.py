@@ -0,0 +1,49 @@
+import streamlit as st
+import pathlib
+
+from utils import get_pokemon_index, get_pokemon_record
+from matchups import get_matchup_matrix
+from displays import display_basic_info, display_filters
+import instrumentation
+
+instrumentation.start_rerun("matchups")
+
+current_path = pathlib.Path(__file__).parent.parent.absolute()
+with open(current_path / "style.css") as f:
+    st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
+
+st.markdown("<h1 style='text-align: center;'>Matchups</h1>", unsafe_allow_html=True)
+
+# Initialization
+if "selected_pokemon" not in st.session_state:
+    st.session_state["selected_pokemon"] = "Bulbasaur"
+
+pokemon_index = get_pokemon_index(columns=("pokedex_number", "name"))
+matchup_matrix = get_matchup_matrix()
+
+with st.sidebar:
+    names = pokemon_index.names
+    st.session_state["selected_pokemon"] = st.selectbox("Select a Pokemon", names,
+                                                        index=names.index(st.session_state["selected_pokemon"]))
+    n_rows = st.slider("Number of Pokemon", min_value=5, max_value=50, value=10, step=5)
+    # The filters restrict the opponents, not the selected pokemon
+    st.caption("Opponents")
+    mask = display_filters()
+
+pokemon = st.session_state["selected_pokemon"]
+display_basic_info(get_pokemon_record(pokemon), image_size=256)
+
+st.write("Damage is the expected damage of the best same-type attack: the type multiplier times the best of the "
+         "attack / defense and special attack / special defense ratios, times 1.5. \"Damage dealt\" and \"damage "
+         f"taken\" are from the point of view of each opponent against {pokemon}.")
+
+col1, col2, col3 = st.columns(3, gap="large")
+with col1:
+    st.subheader("Top threats")
+    st.dataframe(matchup_matrix.threats(pokemon, n_rows, mask), use_container_width=True, hide_index=True)
+with col2:
+    st.subheader("Best counters")
+    st.dataframe(matchup_matrix.counters(pokemon, n_rows, mask), use_container_width=True, hide_index=True)
+with col3:
+    st.subheader("Best targets")
+    st.dataframe(matchup_matrix.targets(pokemon, n_rows, mask), use_container_width=True, hide_index=True)
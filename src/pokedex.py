@@ -2,44 +2,78 @@ import streamlit as st
 
 import pathlib
 
-from utils import (load_pokemon_dataframe,
-                   get_pokedex_number,
+from utils import (get_pokemon_index,
+                   get_pokemon_record,
+                   get_ability_index,
                    )
 
-from displays import display_basic_info, display_base_stats_type_defenses
+from displays import (display_basic_info,
+                      display_base_stats_type_defenses,
+                      display_diagnostics,
+                      display_filters,
+                      filter_names,
+                      )
+import instrumentation
 
 
+instrumentation.start_rerun("pokedex")
+
+# Width in pixels of the pokemon image
+IMAGE_SIZE = 256
+
 st.set_page_config(page_title="Pokemon Dashboard", layout="wide")
 
 current_path = pathlib.Path(__file__).parent.absolute()
 with open(current_path / "style.css") as f:
     st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
 
+# Hidden diagnostics page, opened with ?diagnostics in the url when the instrumentation is enabled
+if instrumentation.ENABLED and "diagnostics" in st.query_params:
+    display_diagnostics()
+    st.stop()
+
 # Initialization
 if "selected_pokemon" not in st.session_state:
     st.session_state["selected_pokemon"] = "Bulbasaur"
 
-pokemon_df = load_pokemon_dataframe()
+pokemon_index = get_pokemon_index(columns=("pokedex_number", "name"))
+
+
+def select_pokemon(name):
+    st.session_state["selected_pokemon"] = name
+
 
 st.markdown("<h1 style='text-align: center;'>Pokédex Dashboard</h1>", unsafe_allow_html=True)
 st.sidebar.title("Pokédex Dashboard")
 
 # Add a selectbox to the sidebar:
 with st.sidebar:
-
+    names = filter_names(pokemon_index.names, display_filters())
     st.session_state["selected_pokemon"] = st.selectbox("Select a Pokemon",
-                                                        pokemon_df["name"].values,
-                                                        index=int(get_pokedex_number(
-                                                            pokemon_df,
-                                                            st.session_state["selected_pokemon"])
-                                                        ) - 1)
-    compare_match = st.selectbox("Compare with", [None] + pokemon_df["name"].values.tolist())
-    compare_match = pokemon_df[pokemon_df["name"] == compare_match] if compare_match is not None else None
-
-
-match = pokemon_df[pokemon_df["name"] == st.session_state["selected_pokemon"]]
-
-display_basic_info(match)
-
-display_base_stats_type_defenses(match, compare_match)
+                                                        names,
+                                                        index=names.index(st.session_state["selected_pokemon"]))
+    compare_name = st.selectbox("Compare with", [None] + pokemon_index.names)
+    compare_record = get_pokemon_record(compare_name) if compare_name is not None else None
+
+    # Pokemon with an ability, found by prefix or approximate name
+    ability_query = st.text_input("Search abilities", placeholder="e.g. Levitate")
+    if ability_query:
+        ability_index = get_ability_index()
+        abilities = ability_index.search(ability_query)
+        if len(abilities) == 0:
+            st.write("No ability found.")
+        else:
+            ability = st.selectbox("Ability", abilities)
+            hidden = ability_index.pokemon_with(ability, hidden=True)
+            for number in sorted(ability_index.pokemon_with(ability)):
+                name = pokemon_index.name(number)
+                st.button(name + (" (Hidden)" if number in hidden else ""), key=f"ability_{number}",
+                          on_click=select_pokemon, args=(name,))
+
+
+record = get_pokemon_record(st.session_state["selected_pokemon"])
+
+display_basic_info(record, image_size=IMAGE_SIZE)
+
+display_base_stats_type_defenses(record, compare_record)
 
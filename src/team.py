@@ -0,0 +1,143 @@
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+from utils import load_pokemon_dataframe, get_pokemon_index, get_type_effectiveness, POKEMON_TYPES
+
+
+TEAM_SIZE = 6
+# Penalty of each extra member weak to the same type, relative to the reward of one more resisted type
+SHARED_WEAKNESS_WEIGHT = 1.0
+# Reward of the base stats total, only used to break ties between teams with the same type coverage
+BASE_TOTAL_WEIGHT = 1e-4
+
+
+def score_teams(weak_counts: np.ndarray, resist_counts: np.ndarray, base_totals: np.ndarray) -> np.ndarray:
+    """Scores a batch of teams from their per-type counts of weak and resisting members.
+
+    Args:
+        weak_counts (np.ndarray): (..., 18) number of members taking x2 or more damage from each type.
+        resist_counts (np.ndarray): (..., 18) number of members taking x0.5 or less damage from each type.
+        base_totals (np.ndarray): (...) sum of the base stats total of the members.
+    """
+    coverage = (resist_counts > 0).sum(axis=-1)
+    shared_weaknesses = np.maximum(weak_counts - 1, 0).sum(axis=-1)
+    return coverage - SHARED_WEAKNESS_WEIGHT * shared_weaknesses + BASE_TOTAL_WEIGHT * base_totals
+
+
+def _beam_search(weak: np.ndarray, resist: np.ndarray, base_totals: np.ndarray, team: tuple,
+                 candidates: np.ndarray, first_candidates: np.ndarray, slots: int, beam_width: int) -> list:
+    """Fills the free slots of the team one member at a time, keeping the best `beam_width` partial teams.
+
+    Every step scores all the (partial team, candidate) pairs in one broadcasted operation.
+
+    Returns:
+        list: (score, team) pairs of the final beam, sorted by score.
+    """
+    beams = [tuple(sorted(team))]
+    beam_weak = weak[list(team)].sum(axis=0, keepdims=True)
+    beam_resist = resist[list(team)].sum(axis=0, keepdims=True)
+    beam_totals = base_totals[list(team)].sum(keepdims=True)
+    scores = score_teams(beam_weak, beam_resist, beam_totals)
+
+    for step in range(slots):
+        step_candidates = first_candidates if step == 0 else candidates
+        new_weak = beam_weak[:, np.newaxis, :] + weak[step_candidates][np.newaxis, :, :]
+        new_resist = beam_resist[:, np.newaxis, :] + resist[step_candidates][np.newaxis, :, :]
+        new_totals = beam_totals[:, np.newaxis] + base_totals[step_candidates][np.newaxis, :]
+        new_scores = score_teams(new_weak, new_resist, new_totals)
+        for b, beam in enumerate(beams):
+            new_scores[b, np.isin(step_candidates, beam)] = -np.inf
+
+        next_beams, next_indices, seen = [], [], set()
+        for flat_index in np.argsort(new_scores, axis=None, kind="stable")[::-1]:
+            b, c = divmod(int(flat_index), len(step_candidates))
+            if new_scores[b, c] == -np.inf or len(next_beams) == beam_width:
+                break
+            new_team = tuple(sorted(beams[b] + (int(step_candidates[c]),)))
+            if new_team not in seen:
+                seen.add(new_team)
+                next_beams.append(new_team)
+                next_indices.append((b, c))
+        if not next_beams:
+            break
+
+        rows, columns = np.array(next_indices).T
+        beams = next_beams
+        beam_weak, beam_resist = new_weak[rows, columns], new_resist[rows, columns]
+        beam_totals, scores = new_totals[rows, columns], new_scores[rows, columns]
+    return sorted(zip(scores.tolist(), beams), reverse=True)
+
+
+def suggest_team(team_names: list, n_suggestions: int = 5, beam_width: int = 64, allow_legendary: bool = True,
+                 workers: int = None) -> pd.DataFrame:
+    """Suggests the members that best complete a partial team.
+
+    Teams are scored by the number of types resisted by at least one member minus the number of extra members weak
+    to the same type (see `score_teams`). The search is a beam search over the candidates, where pokemon with the
+    same type effectiveness are pruned to the one with the highest base stats total.
+
+    Args:
+        team_names (list): names of the pokemon already in the team (up to 6, all different).
+        n_suggestions (int, optional): number of suggested teams. Defaults to 5.
+        beam_width (int, optional): partial teams kept at every step. Defaults to 64.
+        allow_legendary (bool, optional): whether legendary pokemon can be suggested. Defaults to True.
+        workers (int, optional): split the first pick among this many processes. Defaults to None (no processes).
+
+    Returns:
+        pd.DataFrame: suggested teams sorted by score, with the added members, the whole team, the score, the number
+            of resisted types and the number of shared weaknesses.
+    """
+    if len(team_names) > TEAM_SIZE:
+        raise ValueError(f"A team has at most {TEAM_SIZE} members, got {len(team_names)}")
+    pokemon_index = get_pokemon_index()
+    effectiveness = get_type_effectiveness()
+    pokemon_df = load_pokemon_dataframe(columns=("base_total", "is_legendary"))
+
+    weak = (effectiveness.matrix > 1).astype(np.int8)
+    resist = (effectiveness.matrix < 1).astype(np.int8)
+    base_totals = pokemon_df["base_total"].to_numpy(dtype=np.float64)
+    team = tuple(pokemon_index.position(name) for name in team_names)
+    if len(set(team)) < len(team):
+        raise ValueError(f"A team cannot have the same pokemon twice, got {team_names}")
+
+    # Prune the candidates: keep only the strongest pokemon of each type effectiveness profile
+    allowed = ~np.isin(np.arange(len(base_totals)), team)
+    if not allow_legendary:
+        allowed &= pokemon_df["is_legendary"].to_numpy() == 0
+    allowed_rows = np.flatnonzero(allowed)
+    order = allowed_rows[np.lexsort((-base_totals[allowed_rows],))]
+    _, first_of_profile = np.unique(effectiveness.matrix[order], axis=0, return_index=True)
+    candidates = np.sort(order[first_of_profile])
+
+    slots = TEAM_SIZE - len(team)
+    width = max(beam_width, n_suggestions)
+    if workers is None or workers <= 1 or slots == 0:
+        results = _beam_search(weak, resist, base_totals, team, candidates, candidates, slots, width)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_beam_search, weak, resist, base_totals, team, candidates, first_candidates,
+                                       slots, width)
+                       for first_candidates in np.array_split(candidates, workers)]
+            results = sorted({result for future in futures for result in future.result()}, reverse=True)
+
+    suggestions = []
+    for score, new_team in results[:n_suggestions]:
+        added = [position for position in new_team if position not in team]
+        suggestions.append({
+            "suggested": ", ".join(pokemon_index.names[position] for position in added),
+            "team": ", ".join(pokemon_index.names[position] for position in team + tuple(added)),
+            "score": round(score, 4),
+            "resisted types": int((resist[list(new_team)].sum(axis=0) > 0).sum()),
+            "shared weaknesses": int(np.maximum(weak[list(new_team)].sum(axis=0) - 1, 0).sum()),
+        })
+    return pd.DataFrame(suggestions)
+
+
+def team_coverage(team_names: list) -> pd.DataFrame:
+    """Returns, for every attacking type, how many members of the team are weak to it and how many resist it."""
+    pokemon_index = get_pokemon_index()
+    rows = get_type_effectiveness().rows([pokemon_index.number(name) for name in team_names])
+    return pd.DataFrame({"type": POKEMON_TYPES,
+                         "weak": (rows > 1).sum(axis=0),
+                         "resist": (rows < 1).sum(axis=0)})
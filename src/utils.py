@@ -1,162 +1,551 @@
 import pandas as pd
 import numpy as np
 import streamlit as st
-import plotly
-import plotly.express as px
 import pathlib
-from PIL import Image
-import umap
-from sklearn.preprocessing import MinMaxScaler
+import hashlib
+import json
+import ast
+import threading
+import bisect
+import collections
+import os
+import time
 
+from streamlit.logger import get_logger
 
-@st.cache_data
-def load_pokemon_dataframe():
-    """Loads the pokemon dataframe."""
+from instrumentation import instrument
+import image_server
+
+# umap (numba), sklearn, plotly.express and PIL are imported inside the functions that use them, so pages that never
+# fit an embedding or draw the scatter plot do not pay their import time. See scripts/check_import_time.py.
+
+logger = get_logger(__name__)
+
+
+POKEMON_CSV_FILE = "data/pokemon.csv"
+# Typed columnar copy of the pokemon csv, see scripts/build_typed_data.py
+POKEMON_TYPED_FILE = "data/pokemon.parquet"
+POKEMON_TYPES = ["bug", "dark", "dragon", "electric", "fairy", "fighting", "fire", "flying", "ghost", "grass", "ground",
+                 "ice", "normal", "poison", "psychic", "rock", "steel", "water"]
+# Damage multiplier columns, in the same order as POKEMON_TYPES
+AGAINST_COLUMNS = ["against_" + ("fight" if type_ == "fighting" else type_) for type_ in POKEMON_TYPES]
+STAT_COLUMNS = ["hp", "attack", "defense", "sp_attack", "sp_defense", "speed"]
+# Position of the hidden ability in the abilities list of the csv
+HIDDEN_ABILITY_SLOT = 2
+# Minimum trigram similarity of a fuzzy ability match
+FUZZY_MIN_SCORE = 0.3
+# Categorical columns the pokemon can be filtered by, see FacetIndex
+FACET_COLUMNS = ["type1", "type2", "generation", "is_legendary"]
+# Damage multipliers shown in the type defenses panel
+DEFENSE_MULTIPLIERS = (4, 2, 0.5, 0.25, 0)
+# Parameters of the UMAP model. They are part of the key of the stored embedding, so changing them forces a refit.
+UMAP_PARAMS = {"n_neighbors": 5, "min_dist": 0.3, "metric": "correlation", "random_state": 0}
+UMAP_EMBEDDING_FILE = "data/umap_embedding.npy"
+UMAP_METADATA_FILE = "data/umap_embedding.json"
+# Fitted scaler and UMAP model, used to project pokemon appended to the csv without a refit
+UMAP_MODEL_FILE = "data/umap_model.joblib"
+# Downscaled variants of the pokemon images, see scripts/build_thumbnails.py
+THUMBNAIL_SIZES = (64, 128, 256)
+THUMBNAIL_DIR = "images/thumbnails"
+# Numeric columns left out of the feature matrix UMAP and the similarity metrics are computed on
+EXCLUDED_FEATURE_COLUMNS = ["percentage_male", "generation", "pokedex_number", "height_m", "weight_kg"]
+# "umap" ranks by distance in the embedding, the others compare the scaled feature matrix (see SimilarityEngine)
+SIMILARITY_METRICS = ("umap", "cosine", "euclidean", "weighted")
+# Groups of features that are weighted together by the "weighted" metric
+FEATURE_WEIGHT_GROUPS = STAT_COLUMNS + ["type defenses", "other"]
+EVOLUTIONS_CSV_FILE = "data/evolutions.csv"
+# Precomputed indexes loaded by the dashboard when they are up to date, see scripts/build.py
+NEIGHBORS_FILE = "data/neighbors.npz"
+EVOLUTION_INDEX_FILE = "data/evolution_index.json"
+# Directory the numeric matrices are published to for multi-worker deployments (e.g. /dev/shm/pokedex), see
+# scripts/publish_shared_data.py. When it is not set, every process builds its own copies.
+SHARED_DATA_DIR = os.environ.get("POKEDEX_SHARED_DATA_DIR")
+SHARED_MANIFEST_FILE = "manifest.json"
+# Maximum number of entries of the per-pokemon streamlit data caches
+CACHE_MAX_ENTRIES = 256
+
+# Shared dataframes are handed out as views, copy-on-write keeps callers from modifying them (always on in pandas 3)
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
+
+def get_project_path() -> pathlib.Path:
+    """Returns the absolute path of the project root (the parent of the src folder)."""
     parent_path = pathlib.Path(__file__).parent
     # Loop until get src folder
     while parent_path.name != "src":
         parent_path = parent_path.parent
+    return parent_path.parent.absolute()
+
+
+def get_pokemon_csv_hash() -> str:
+    """Returns the sha256 of the pokemon csv, used to detect outdated derived data."""
+    return hashlib.sha256((get_project_path() / POKEMON_CSV_FILE).read_bytes()).hexdigest()
+
+
+def convert_pokemon_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """Converts the columns of the raw pokemon csv to compact types.
 
-    pokemon_path = parent_path.parent.absolute() / "data/pokemon.csv"
-    df = pd.read_csv(pokemon_path)
+    Types are categorical, stats are int16, damage multipliers are float32 and abilities are parsed into lists.
+    """
+    dtypes = {}
+    for column in df.columns:
+        if column.startswith("against_") or column in ["height_m", "weight_kg", "percentage_male"]:
+            dtypes[column] = np.float32
+        elif column in STAT_COLUMNS + ["base_total", "base_egg_steps", "base_happiness", "pokedex_number"]:
+            dtypes[column] = np.int16
+        elif column in ["generation", "is_legendary"]:
+            dtypes[column] = np.int8
+        elif column == "experience_growth":
+            dtypes[column] = np.int32
+        elif column in ["type1", "type2"]:
+            dtypes[column] = pd.CategoricalDtype(POKEMON_TYPES)
+    df = df.astype(dtypes)
+    if "abilities" in df.columns:
+        df["abilities"] = df["abilities"].map(ast.literal_eval)
     return df
 
 
-@st.cache_data
-def get_df_with_umap():
-    np.random.seed(0)
-    df = load_pokemon_dataframe()
+def build_typed_data(force: bool = False) -> bool:
+    """Writes the typed columnar copy of the pokemon csv if it is missing or outdated.
+
+    The hash of the csv is stored in the parquet metadata, so the loader can tell if the file is outdated.
+
+    Args:
+        force (bool, optional): Rewrite the file even if it is up to date. Defaults to False.
+
+    Returns:
+        bool: Whether the file was (re)written.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    key = get_pokemon_csv_hash()
+    if not force and _read_typed_data_key() == key:
+        return False
+    df = convert_pokemon_dtypes(pd.read_csv(get_project_path() / POKEMON_CSV_FILE))
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({**table.schema.metadata, b"pokemon_csv_sha256": key.encode()})
+    pq.write_table(table, get_project_path() / POKEMON_TYPED_FILE)
+    return True
+
+
+def _read_typed_data_key():
+    """Returns the csv hash stored in the typed data file, None if it is missing or pyarrow is not installed."""
+    try:
+        import pyarrow.parquet as pq
+        metadata = pq.read_schema(get_project_path() / POKEMON_TYPED_FILE).metadata or {}
+    except (ImportError, OSError):
+        return None
+    key = metadata.get(b"pokemon_csv_sha256")
+    return key.decode() if key is not None else None
+
+
+@instrument
+def read_pokemon_dataframe(columns: tuple = None) -> pd.DataFrame:
+    """Reads the pokemon dataframe from disk.
+
+    It reads the typed columnar file if it is up to date with the csv, and falls back to the csv otherwise. Both
+    return the same column types.
+
+    Args:
+        columns (tuple, optional): Columns to read. Defaults to None (all columns).
+    """
+    columns = list(columns) if columns is not None else None
+    if _read_typed_data_key() == get_pokemon_csv_hash():
+        df = pd.read_parquet(get_project_path() / POKEMON_TYPED_FILE, columns=columns)
+        if "abilities" in df.columns:
+            df["abilities"] = df["abilities"].map(list)
+        return df
+    df = pd.read_csv(get_project_path() / POKEMON_CSV_FILE, usecols=columns)
+    return convert_pokemon_dtypes(df[columns] if columns is not None else df)
+
+
+class PokemonDataset:
+    """Read-only pokemon data shared by every session of the process.
+
+    Columns are read from disk the first time they are requested and then handed out as copy-on-write views, so
+    getting a dataframe neither hashes nor copies anything. The UMAP embedding is a read-only array.
+    """
+
+    def __init__(self):
+        self.column_names = pd.read_csv(get_project_path() / POKEMON_CSV_FILE, nrows=0).columns.tolist()
+        # (dataframe, series by column) of the loaded columns, replaced as a whole so readers never see one updated
+        # without the other
+        self._loaded = (pd.DataFrame(), {})
+        self._embedding = None
+        self._lock = threading.RLock()
+
+    def frame(self, columns: tuple = None) -> pd.DataFrame:
+        """Returns a view of the given columns (all of them by default)."""
+        df, series = self._loaded
+        missing = [column for column in (columns or self.column_names) if column not in series]
+        if missing:
+            with self._lock:
+                df, series = self._loaded
+                missing = [column for column in missing if column not in series]
+                if missing:
+                    df = pd.concat([df, read_pokemon_dataframe(tuple(missing))], axis=1)
+                    df = df[[column for column in self.column_names if column in df.columns]]
+                    series = {column: df[column] for column in df.columns}
+                    self._loaded = (df, series)
+        if columns is None:
+            return df.copy(deep=False)
+        return pd.DataFrame({column: series[column] for column in columns}, copy=False)
+
+    @property
+    def embedding(self) -> np.ndarray:
+        """Returns the normalized UMAP components of every pokemon as a read-only (n, 2) array."""
+        if self._embedding is None:
+            with self._lock:
+                if self._embedding is None:
+                    shared_data = get_shared_data()
+                    self._embedding = (shared_data["embedding"] if shared_data is not None
+                                       else _load_or_fit_umap_embedding())
+        return self._embedding
+
+
+@instrument(cache=st.cache_resource)
+def get_dataset() -> PokemonDataset:
+    """Returns the pokemon dataset shared by every session. Built once per process."""
+    return PokemonDataset()
+
+
+@instrument
+def load_pokemon_dataframe(columns: tuple = None):
+    """Loads the pokemon dataframe.
+
+    The dataframe is a copy-on-write view of the shared dataset, so modifying it does not affect other callers.
+
+    Args:
+        columns (tuple, optional): Columns to load. Defaults to None (all columns).
+    """
+    return get_dataset().frame(columns)
+
 
-    # Select numeric columns
+def get_feature_columns(df: pd.DataFrame) -> list:
+    """Returns the numeric columns without missing values that describe a pokemon (the UMAP features)."""
     numeric_cols = df.select_dtypes(include="number").columns
-    remove_cols = ["percentage_male", "generation", "pokedex_number", "height_m", "weight_kg"]
-    numeric_cols = [col for col in numeric_cols if col not in remove_cols and df[col].isna().sum() == 0]
-    df_numeric = df[numeric_cols]
+    return [col for col in numeric_cols if col not in EXCLUDED_FEATURE_COLUMNS and df[col].isna().sum() == 0]
+
+
+def get_umap_key() -> str:
+    """Returns the key of the UMAP embedding: a hash of the pokemon csv and the UMAP parameters."""
+    sha = hashlib.sha256()
+    sha.update((get_project_path() / POKEMON_CSV_FILE).read_bytes())
+    sha.update(json.dumps(UMAP_PARAMS, sort_keys=True).encode())
+    return sha.hexdigest()
+
+
+def get_feature_matrix(df: pd.DataFrame = None) -> pd.DataFrame:
+    """Returns the unscaled feature columns of every pokemon, the input of UMAP."""
+    df = load_pokemon_dataframe() if df is None else df
+    return df[get_feature_columns(df)]
+
+
+def _hash_rows(features: pd.DataFrame) -> str:
+    return hashlib.sha256(np.ascontiguousarray(features.to_numpy(dtype=np.float64)).tobytes()).hexdigest()
+
+
+@instrument
+def fit_umap_model(features: pd.DataFrame):
+    """Fits the scaler and UMAP on the feature matrix.
+
+    Returns:
+        tuple: the model, a dictionary with the fitted scaler, the UMAP model and the range of the raw embedding used
+            to normalize it, and the normalized 2-D embedding of the rows.
+    """
+    import umap
+    from sklearn.preprocessing import MinMaxScaler
+
+    np.random.seed(0)
 
     # Scale data
     scaler = MinMaxScaler()
-    df_numeric = pd.DataFrame(scaler.fit_transform(df_numeric), columns=df_numeric.columns)
+    df_numeric = pd.DataFrame(scaler.fit_transform(features), columns=features.columns)
 
     # UMAP
-    umap_model = umap.UMAP(n_neighbors=5, min_dist=0.3, metric="correlation", random_state=0)
+    umap_model = umap.UMAP(**UMAP_PARAMS)
     umap_embeddings = umap_model.fit_transform(df_numeric)
-    umap_df = pd.DataFrame(umap_embeddings, columns=["first component", "second component"])
 
     # Normalize components
-    min_first_component = umap_df["first component"].min()
-    max_first_component = umap_df["first component"].max()
-    min_second_component = umap_df["second component"].min()
-    max_second_component = umap_df["second component"].max()
-    umap_df["first component"] = (umap_df["first component"] - min_first_component) / (max_first_component - min_first_component)
-    umap_df["second component"] = (umap_df["second component"] - min_second_component) / (max_second_component - min_second_component)
-    return umap_df
+    model = {"params": UMAP_PARAMS, "columns": list(features.columns), "scaler": scaler, "umap": umap_model,
+             "min_components": umap_embeddings.min(axis=0), "max_components": umap_embeddings.max(axis=0)}
+    return model, _normalize_umap_embedding(model, umap_embeddings)
 
 
-@st.cache_data
-def pokemon_umap(color_by: str = "type", pokedex_number: int = 1):
-    """Display an umap plot of pokemon.
+def _normalize_umap_embedding(model: dict, umap_embeddings: np.ndarray) -> np.ndarray:
+    return (umap_embeddings - model["min_components"]) / (model["max_components"] - model["min_components"])
+
+
+@instrument
+def project_umap_embedding(model: dict, features: pd.DataFrame) -> np.ndarray:
+    """Projects new rows into the space of a fitted model with the fitted scaler and `UMAP.transform`.
+
+    Rows are normalized with the range of the original fit, so existing points keep their coordinates (new points
+    may fall slightly outside [0, 1]).
+    """
+    df_numeric = pd.DataFrame(model["scaler"].transform(features[model["columns"]]), columns=model["columns"])
+    return _normalize_umap_embedding(model, model["umap"].transform(df_numeric))
+
+
+@instrument
+def compute_umap_embedding() -> np.ndarray:
+    """Fits UMAP on the scaled numeric columns and returns the normalized 2-D embedding."""
+    return fit_umap_model(get_feature_matrix())[1]
+
+
+def save_umap_embedding(embedding: np.ndarray, key: str, features: pd.DataFrame = None, model: dict = None):
+    """Writes the embedding next to pokemon.csv together with the key it was computed with.
 
     Args:
-        color_by (str, optional): Color by type or similarity. Defaults to "type". Can be "type" or "pop-out".
-        pokedex_number (int, optional): Current pokemon id, used to color by pop-out. Defaults to 1.
+        embedding (np.ndarray): normalized embedding of every pokemon.
+        key (str): key of the embedding, see `get_umap_key`.
+        features (pd.DataFrame, optional): feature matrix the embedding was computed from. Its hash is stored so that
+            rows appended later can be projected instead of refitting. Defaults to None.
+        model (dict, optional): fitted model (see `fit_umap_model`) to store when the embedding was refitted.
+            Defaults to None (keep the stored model).
     """
-    np.random.seed(42)
-    df = load_pokemon_dataframe()
-    umap_df = get_df_with_umap()
-
-    df["first component"] = umap_df["first component"]
-    df["second component"] = umap_df["second component"]
-
-    # Get the hex color of each type
-    type_colors = {
-        'normal': '#aa9',
-        'fire': '#f42',
-        'water': '#39f',
-        'electric': '#fc3',
-        'grass': '#7c5',
-        'ice': '#6cf',
-        'fighting': '#b54',
-        'poison': '#a59',
-        'ground': '#db5',
-        'flying': '#89f',
-        'psychic': '#f59',
-        'bug': '#ab2',
-        'rock': '#ba6',
-        'ghost': '#66b',
-        'dragon': '#76e',
-        'dark': '#754',
-        'steel': '#aab',
-        'fairy': '#e9e',
-        'curse': '#698'
-    }
+    project_path = get_project_path()
+    metadata = {"key": key, "params": UMAP_PARAMS}
+    if features is not None:
+        previous = _read_umap_metadata() if model is None else {}
+        metadata.update(rows=len(features), rows_sha256=_hash_rows(features),
+                        fitted_rows=len(features) if model is not None else previous.get("fitted_rows"))
+    if model is not None:
+        import joblib
+        joblib.dump(model, project_path / UMAP_MODEL_FILE, compress=3)
+    np.save(project_path / UMAP_EMBEDDING_FILE, np.asarray(embedding, dtype=np.float64))
+    with open(project_path / UMAP_METADATA_FILE, "w") as f:
+        json.dump(metadata, f, indent=4)
+
+
+def _read_umap_metadata() -> dict:
+    try:
+        with open(get_project_path() / UMAP_METADATA_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def load_umap_embedding(key: str):
+    """Returns the stored embedding (memory-mapped) if it was computed with the given key, None otherwise."""
+    if _read_umap_metadata().get("key") != key:
+        return None
+    try:
+        return np.load(get_project_path() / UMAP_EMBEDDING_FILE, mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+
+
+def load_umap_model():
+    """Returns the stored fitted model if it was fitted with the current parameters, None otherwise."""
+    try:
+        import joblib
+        model = joblib.load(get_project_path() / UMAP_MODEL_FILE)
+    except Exception:  # missing, or pickled with incompatible versions of umap/sklearn
+        return None
+    return model if model.get("params") == UMAP_PARAMS else None
+
+
+def append_umap_embedding(key: str, features: pd.DataFrame):
+    """Projects the rows added since the stored embedding was computed, without refitting.
+
+    Only possible when the stored model was fitted with the current parameters and the stored embedding covers the
+    first rows of the feature matrix unchanged.
+
+    Returns:
+        np.ndarray: the embedding of every row, or None if the stored embedding cannot be extended.
+    """
+    metadata = _read_umap_metadata()
+    rows = metadata.get("rows")
+    if rows is None or rows > len(features) or metadata.get("params") != UMAP_PARAMS:
+        return None
+    if _hash_rows(features.iloc[:rows]) != metadata.get("rows_sha256"):
+        return None
+    model = load_umap_model()
+    if model is None or model["columns"] != list(features.columns):
+        return None
+    try:
+        embedding = np.load(get_project_path() / UMAP_EMBEDDING_FILE)
+    except (OSError, ValueError):
+        return None
+    if len(embedding) != rows:
+        return None
+    if rows < len(features):
+        embedding = np.concatenate([embedding, project_umap_embedding(model, features.iloc[rows:])])
+    return embedding
+
+
+def build_umap_embedding(force: bool = False) -> bool:
+    """Computes and stores the UMAP embedding if the stored one is missing or outdated.
+
+    Pokemon appended to the csv are projected into the existing space with the stored model, so the other pokemon
+    keep their coordinates. Any other change (edited rows, new parameters, missing model) refits UMAP.
+
+    Args:
+        force (bool, optional): Refit even if the stored embedding is up to date. Defaults to False.
+
+    Returns:
+        bool: Whether the embedding was (re)computed.
+    """
+    key = get_umap_key()
+    if not force and load_umap_embedding(key) is not None and load_umap_model() is not None:
+        return False
+    features = get_feature_matrix()
+    embedding = None if force else append_umap_embedding(key, features)
+    if embedding is not None:
+        save_umap_embedding(embedding, key, features)
+    else:
+        model, embedding = fit_umap_model(features)
+        save_umap_embedding(embedding, key, features, model)
+    return True
+
+
+def _load_or_fit_umap_embedding() -> np.ndarray:
+    """Returns the stored UMAP embedding, extending or refitting it if the pokemon csv or the parameters changed."""
+    key = get_umap_key()
+    embedding = load_umap_embedding(key)
+    if embedding is None:
+        features = get_feature_matrix()
+        embedding = append_umap_embedding(key, features)
+        model = None
+        if embedding is None:
+            model, embedding = fit_umap_model(features)
+        try:
+            save_umap_embedding(embedding, key, features, model)
+        except OSError:  # read-only deployments just keep the embedding in memory
+            pass
+    embedding = np.array(embedding)
+    embedding.setflags(write=False)
+    return embedding
+
+
+@instrument
+def get_df_with_umap():
+    """Returns the normalized UMAP components of every pokemon.
+
+    The embedding is read from the stored artifact (see scripts/build_umap.py). It is only refitted when the
+    pokemon csv or the UMAP parameters changed since the artifact was built.
+    """
+    return pd.DataFrame(get_dataset().embedding, columns=["first component", "second component"], copy=False)
+
+
+# Hex color of each type
+TYPE_COLORS = {
+    'normal': '#aa9',
+    'fire': '#f42',
+    'water': '#39f',
+    'electric': '#fc3',
+    'grass': '#7c5',
+    'ice': '#6cf',
+    'fighting': '#b54',
+    'poison': '#a59',
+    'ground': '#db5',
+    'flying': '#89f',
+    'psychic': '#f59',
+    'bug': '#ab2',
+    'rock': '#ba6',
+    'ghost': '#66b',
+    'dragon': '#76e',
+    'dark': '#754',
+    'steel': '#aab',
+    'fairy': '#e9e',
+    'curse': '#698'
+}
+
+
+@instrument(cache=st.cache_resource)
+def get_base_umap_figure(color_by: str = "type") -> dict:
+    """Returns the umap scatter plot of every pokemon as a plotly figure dictionary, built once per color mode.
+
+    The returned dictionary is shared by every session and must not be modified.
+
+    Args:
+        color_by (str, optional): "type" to color by primary type or "pop-out" to draw every point in gray.
+            Defaults to "type".
+    """
+    import plotly.express as px
+
+    df = load_pokemon_dataframe(columns=("name", "type1", "type2"))
+    df = pd.concat([df, get_df_with_umap()], axis=1)
 
     if color_by == "type":
-        # Plot
-        fig = px.scatter(
-            df,
-            x="first component",
-            y="second component",
-            # title="Pokemon Embeddings",
-            color="type1",
-            color_discrete_map=type_colors,
-            hover_name="name",
-            hover_data=["type1", "type2"],
-            width=800,
-            height=600,
-        )
-        # fig.update_traces(marker=dict(size=12, line=dict(width=2, color="DarkSlateGrey")))
-        """fig.update_layout(
-            plot_bgcolor="#f9f9f9",
-            paper_bgcolor="#f9f9f9",
-            font_color="#333333",
-            margin=dict(l=0, r=0, t=0, b=0),
-        )"""
+        color, colors = "type1", TYPE_COLORS
     elif color_by == "pop-out":
-        df["pop-out"] = df["pokedex_number"] == pokedex_number
-        # Get the name of the current pokemon
-        current_pokemon = df[df["pokedex_number"] == pokedex_number]["name"].values[0]
-        df['pop-out'] = df['pop-out'].apply(lambda x: current_pokemon if x else f'Not {current_pokemon}')
-        popout_colors = {
-            current_pokemon: '#ff0000',
-            f'Not {current_pokemon}': '#808080'
-        }
-        # Plot
-        fig = px.scatter(
-            df,
-            x="first component",
-            y="second component",
-            color="pop-out",
-            color_discrete_map=popout_colors,
-            hover_name="name",
-            hover_data=["type1", "type2"],
-            width=800,
-            height=600,
-        )
-        # fig.update_traces(marker=dict(size=12, line=dict(width=2, color="DarkSlateGrey")))
-        # Center the plot on the current pokemon
-        fig.update_layout(
-            #plot_bgcolor="#f9f9f9",
-            #paper_bgcolor="#f9f9f9",
-            #font_color="#333333",
-            margin=dict(l=0, r=0, t=0, b=0),
-            xaxis=dict(range=[df[df["name"] == current_pokemon]["first component"].values[0] - 0.1,
-                              df[df["name"] == current_pokemon]["first component"].values[0] + 0.1]),
-            yaxis=dict(range=[df[df["name"] == current_pokemon]["second component"].values[0] - 0.1,
-                              df[df["name"] == current_pokemon]["second component"].values[0] + 0.1]),
-        )
+        df["pop-out"] = "Other Pokemon"
+        color, colors = "pop-out", {"Other Pokemon": '#808080'}
     else:
         raise ValueError(f"color_by must be 'type' or 'pop-out', got {color_by}")
-    return fig
 
+    fig = px.scatter(
+        df,
+        x="first component",
+        y="second component",
+        color=color,
+        color_discrete_map=colors,
+        hover_name="name",
+        hover_data=["type1", "type2"],
+        width=800,
+        height=600,
+        render_mode="webgl",
+    )
+    if color_by == "pop-out":
+        fig.update_layout(margin=dict(l=0, r=0, t=0, b=0))
+    return fig.to_dict()
 
-def _cosine_similarity(a: np.ndarray, b: np.ndarray) -> float:
-    """Returns the cosine similarity between two vectors."""
-    return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
 
+@instrument(cache=st.cache_resource)
+def get_umap_trace_positions(color_by: str = "type") -> list:
+    """Returns the pokemon row positions of the points of each trace of the base umap figure."""
+    type1 = load_pokemon_dataframe(columns=("type1",))["type1"].to_numpy(dtype=object)
+    positions = []
+    for trace in get_base_umap_figure(color_by)["data"]:
+        # Traces hold their group in dataframe order, one trace per primary type (or a single one in pop-out mode)
+        positions.append(np.flatnonzero(type1 == trace["name"]) if color_by == "type" else np.arange(len(type1)))
+    return positions
 
-def _vectorized_cosine_similarity(a: pd.DataFrame, b: pd.DataFrame) -> pd.Series:
-    """Returns the cosine similarity between two vectors."""
-    return np.dot(a, b.T) / (np.linalg.norm(a) * np.linalg.norm(b, axis=1))
+
+@instrument
+def pokemon_umap(color_by: str = "type", pokedex_number: int = 1, mask: np.ndarray = None) -> dict:
+    """Display an umap plot of pokemon.
+
+    The base scatter plot is shared between calls. In "pop-out" mode the current pokemon is added as a single-point
+    trace and the axes are centered on it.
+
+    Args:
+        color_by (str, optional): Color by type or similarity. Defaults to "type". Can be "type" or "pop-out".
+        pokedex_number (int, optional): Current pokemon id, used to color by pop-out. Defaults to 1.
+        mask (np.ndarray, optional): boolean mask of the pokemon rows to highlight (see FacetIndex), the others are
+            faded out. Defaults to None (all of them).
+    """
+    base_fig = get_base_umap_figure(color_by)
+    if mask is not None:
+        data = []
+        for trace, positions in zip(base_fig["data"], get_umap_trace_positions(color_by)):
+            data.append({**trace, "selectedpoints": np.flatnonzero(mask[positions]).tolist(),
+                         "unselected": {"marker": {"opacity": 0.1}}})
+        base_fig = {"data": data, "layout": base_fig["layout"]}
+    if color_by != "pop-out":
+        return base_fig
+
+    pokemon_index = get_pokemon_index()
+    position = pokemon_index.positions_by_number[pokedex_number]
+    x, y = get_dataset().embedding[position]
+    name = pokemon_index.names[position]
+    highlight = {
+        "type": "scattergl",
+        "mode": "markers",
+        "x": [x],
+        "y": [y],
+        "name": name,
+        "marker": {"color": '#ff0000', "size": 10},
+        "hovertemplate": f"<b>{name}</b><extra></extra>",
+    }
+    layout = dict(base_fig["layout"])
+    layout["xaxis"] = {**layout.get("xaxis", {}), "range": [x - 0.1, x + 0.1]}
+    layout["yaxis"] = {**layout.get("yaxis", {}), "range": [y - 0.1, y + 0.1]}
+    return {"data": [*base_fig["data"], highlight], "layout": layout}
 
 
 def _vectorized_euclidean_distance(a: pd.DataFrame, b: pd.DataFrame, normalize=True) -> pd.Series:
@@ -169,130 +558,1064 @@ def _vectorized_euclidean_distance(a: pd.DataFrame, b: pd.DataFrame, normalize=T
     return result
 
 
-@st.cache_data
+@instrument(cache=st.cache_data(max_entries=CACHE_MAX_ENTRIES))
 def get_similarities(pokemon_name: str) -> pd.Series:
     """Returns a list of similarities to the current pokemon sorted by pokedex number."""
-    np.random.seed(42)
+    embedding = get_dataset().embedding
+    current_pokemon = embedding[get_pokemon_index().position(pokemon_name)]
+
+    # Use the normalized euclidean distance to get the similarity between the current pokemon and all the others
+    return pd.Series(1 - _vectorized_euclidean_distance(embedding, current_pokemon), name="similarity")
+
+
+class NeighborIndex:
+    """Precomputed nearest-neighbor ranking of every pokemon in the UMAP space.
+
+    The full distance matrix is computed and sorted once (or attached from the published shared data), so a query
+    only slices the top-k rows.
+    Similarities are 1 minus the euclidean distance normalized by the farthest pokemon, as in `get_similarities`.
+    """
+
+    def __init__(self, pokemon_df: pd.DataFrame, order: np.ndarray, similarities: np.ndarray):
+        self.order = order
+        self.similarities = similarities
+        self.positions = {name: i for i, name in enumerate(pokemon_df["name"].values)}
+        self.table = pokemon_df[["pokedex_number", "name", "type1", "type2"]].rename(
+            {"pokedex_number": "#"}, axis=1).reset_index(drop=True)
+
+    @classmethod
+    def from_embedding(cls, pokemon_df: pd.DataFrame, embedding: np.ndarray) -> "NeighborIndex":
+        """Builds the index by sorting the distance matrix of the embedding."""
+        embedding = np.asarray(embedding, dtype=np.float64)
+        distances = np.linalg.norm(embedding[:, np.newaxis, :] - embedding[np.newaxis, :, :], axis=2)
+        order = np.argsort(distances, axis=1, kind="stable")
+        sorted_distances = np.take_along_axis(distances, order, axis=1)
+        return cls(pokemon_df, order, np.round(1 - sorted_distances / sorted_distances[:, -1:], 4))
+
+    def __len__(self):
+        return len(self.positions)
+
+    def nearest_positions(self, name: str, k: int = 10, start: int = 0, mask: np.ndarray = None) -> tuple:
+        """Returns the row positions and similarities of the k most similar pokemon to the given one.
+
+        The pokemon itself is included and the rows are sorted by similarity. Only slices the precomputed arrays.
+
+        Args:
+            name (str): name of the pokemon to query.
+            k (int, optional): number of rows to return. Defaults to 10.
+            start (int, optional): rank of the first row, to return one page of the ranking. Defaults to 0.
+            mask (np.ndarray, optional): boolean mask of the pokemon rows that can be returned (see FacetIndex).
+                Defaults to None (all of them).
+
+        Returns:
+            tuple: (positions, similarities) arrays.
+        """
+        i = self.positions[name]
+        order, similarities = self.order[i], self.similarities[i]
+        if mask is not None:
+            kept = mask[order]
+            order, similarities = order[kept], similarities[kept]
+        # Similarities may be stored as float32 (see `load_neighbor_arrays`), only the returned ones are converted
+        return order[start:start + k], np.round(similarities[start:start + k].astype(np.float64), 4)
+
+    def nearest(self, name: str, k: int = 10, start: int = 0, mask: np.ndarray = None) -> pd.DataFrame:
+        """Returns the k most similar pokemon to the given one as a table, with a "similarity" column.
+
+        Building the dataframe costs more than the lookup, so use `nearest_positions` outside the display code. See it
+        for the arguments.
+        """
+        order, similarities = self.nearest_positions(name, k, start, mask)
+        df = self.table.take(order).reset_index(drop=True)
+        df["similarity"] = similarities
+        return df
+
+
+def get_embedding_hash(embedding: np.ndarray) -> str:
+    """Returns the sha256 of the embedding values, the key of the neighbor tables computed from it."""
+    return hashlib.sha256(np.ascontiguousarray(embedding, dtype=np.float64).tobytes()).hexdigest()
+
+
+def load_neighbor_arrays(key: str):
+    """Returns the stored (order, similarities) arrays if they were computed with the given key, None otherwise."""
+    try:
+        with np.load(get_project_path() / NEIGHBORS_FILE) as stored:
+            if str(stored["key"]) != key:
+                return None
+            # Similarities are stored as float32 with 4 decimals, they are rounded again when queried
+            return stored["order"].astype(np.intp), stored["similarities"].astype(np.float32)
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def build_neighbor_index(force: bool = False) -> bool:
+    """Computes and stores the sorted neighbor tables if they are missing or the embedding changed.
+
+    Args:
+        force (bool, optional): Recompute even if the stored tables are up to date. Defaults to False.
+
+    Returns:
+        bool: Whether the tables were (re)computed.
+    """
+    embedding = _load_or_fit_umap_embedding()
+    key = get_embedding_hash(embedding)
+    if not force and load_neighbor_arrays(key) is not None:
+        return False
+    index = NeighborIndex.from_embedding(load_pokemon_dataframe(columns=("pokedex_number", "name", "type1", "type2")),
+                                         embedding)
+    np.savez(get_project_path() / NEIGHBORS_FILE, key=np.array(key), order=index.order.astype(np.int16),
+             similarities=index.similarities.astype(np.float32))
+    return True
+
+
+@instrument(cache=st.cache_resource)
+def get_neighbor_index() -> NeighborIndex:
+    """Returns the nearest-neighbor index of the UMAP embedding. Built once per process.
+
+    The stored neighbor tables are used when they were computed from the current embedding.
+    """
+    pokemon_df = load_pokemon_dataframe(columns=("pokedex_number", "name", "type1", "type2"))
+    shared_data = get_shared_data()
+    if shared_data is not None:
+        return NeighborIndex(pokemon_df, shared_data["neighbor_order"], shared_data["neighbor_similarities"])
+    embedding = get_dataset().embedding
+    arrays = load_neighbor_arrays(get_embedding_hash(embedding))
+    if arrays is None:
+        return NeighborIndex.from_embedding(pokemon_df, embedding)
+    return NeighborIndex(pokemon_df, *arrays)
+
+
+class SimilarityEngine:
+    """Similarity between pokemon in the scaled feature space UMAP is fitted on.
+
+    Features are min-max scaled to [0, 1] and kept as float32 matrices, so every metric is a matrix product of the
+    query rows with the whole matrix:
+
+    - "cosine": product of the L2-normalized rows.
+    - "euclidean": distances from |a|^2 + |b|^2 - 2ab (on centered features, which keeps the float32 error low).
+    - "weighted": euclidean with a weight per feature group (see FEATURE_WEIGHT_GROUPS).
+
+    Euclidean similarities are 1 minus the distance normalized by the farthest pokemon, as in `get_similarities`.
+    """
+
+    def __init__(self, pokemon_df: pd.DataFrame, feature_df: pd.DataFrame):
+        features = feature_df.to_numpy(dtype=np.float64)
+        low, high = features.min(axis=0), features.max(axis=0)
+        features = (features - low) / np.where(high > low, high - low, 1)
+        norms = np.linalg.norm(features, axis=1, keepdims=True)
+        self.feature_names = list(feature_df.columns)
+        self.unit_features = (features / np.where(norms > 0, norms, 1)).astype(np.float32)
+        self.centered_features = (features - features.mean(axis=0)).astype(np.float32)
+        self.groups = np.array([FEATURE_WEIGHT_GROUPS.index(self._group(name)) for name in self.feature_names])
+        self.positions = {name: i for i, name in enumerate(pokemon_df["name"].values)}
+        self.table = pokemon_df[["pokedex_number", "name", "type1", "type2"]].rename(
+            {"pokedex_number": "#"}, axis=1).reset_index(drop=True)
+
+    @staticmethod
+    def _group(feature: str) -> str:
+        if feature in STAT_COLUMNS:
+            return feature
+        return "type defenses" if feature.startswith("against_") else "other"
+
+    def __len__(self):
+        return len(self.positions)
+
+    def feature_weights(self, weights: dict = None) -> np.ndarray:
+        """Returns the weight of every feature given the weights of the groups (missing groups weigh 1)."""
+        weights = weights or {}
+        unknown = set(weights) - set(FEATURE_WEIGHT_GROUPS)
+        if unknown:
+            raise ValueError(f"Unknown feature groups {sorted(unknown)}, expected some of {FEATURE_WEIGHT_GROUPS}")
+        group_weights = np.array([weights.get(group, 1.0) for group in FEATURE_WEIGHT_GROUPS], dtype=np.float32)
+        if (group_weights < 0).any():
+            raise ValueError("Weights must be non-negative")
+        return group_weights[self.groups]
+
+    def similarity_matrix(self, positions, metric: str = "cosine", weights: dict = None) -> np.ndarray:
+        """Returns the float32 similarities of the pokemon at the given positions (rows) to every pokemon (columns).
+
+        Args:
+            positions (list): row positions of the query pokemon.
+            metric (str, optional): "cosine", "euclidean" or "weighted". Defaults to "cosine".
+            weights (dict, optional): weight of each feature group, only used by "weighted". Defaults to None.
+        """
+        positions = np.asarray(positions, dtype=np.intp)
+        if metric == "cosine":
+            return np.clip(self.unit_features[positions] @ self.unit_features.T, -1, 1)
+        if metric == "euclidean":
+            features = self.centered_features
+        elif metric == "weighted":
+            features = self.centered_features * np.sqrt(self.feature_weights(weights))
+        else:
+            raise ValueError(f"metric must be one of 'cosine', 'euclidean' or 'weighted', got {metric}")
+
+        squared_norms = np.einsum("ij,ij->i", features, features)
+        squared_distances = squared_norms[positions, np.newaxis] + squared_norms - 2 * (features[positions] @ features.T)
+        distances = np.sqrt(np.maximum(squared_distances, 0))
+        distances[np.arange(len(positions)), positions] = 0
+        farthest = distances.max(axis=1, keepdims=True)
+        return 1 - distances / np.where(farthest > 0, farthest, 1)
+
+    def nearest_many(self, names: list, k: int = 10, metric: str = "cosine", weights: dict = None,
+                     start: int = 0, mask: np.ndarray = None) -> pd.DataFrame:
+        """Returns the k most similar pokemon to each of the given ones, in one vectorized query.
+
+        Args:
+            names (list): names of the pokemon to query.
+            k (int, optional): number of rows per query (the queried pokemon included). Defaults to 10.
+            metric (str, optional): see `similarity_matrix`. Defaults to "cosine".
+            weights (dict, optional): weight of each feature group, only used by "weighted". Defaults to None.
+            start (int, optional): rank of the first row, to return one page of the ranking. Defaults to 0.
+            mask (np.ndarray, optional): boolean mask of the pokemon rows that can be returned (see FacetIndex).
+                Defaults to None (all of them).
+
+        Returns:
+            pd.DataFrame: the columns of `nearest` and a "query" column, k rows per query sorted by similarity.
+        """
+        positions = [self.positions[name] for name in names]
+        similarities = self.similarity_matrix(positions, metric, weights)
+        if mask is not None:
+            # Rank the excluded pokemon last and cut them off
+            similarities = np.where(mask, similarities, -np.inf)
+            k = max(0, min(k, int(mask.sum()) - start))
+        order = np.argsort(-similarities, axis=1, kind="stable")[:, start:start + k]
+        df = self.table.take(order.ravel()).reset_index(drop=True)
+        df["similarity"] = np.round(np.take_along_axis(similarities, order, axis=1).ravel().astype(np.float64), 4)
+        df.insert(0, "query", np.repeat(np.asarray(names, dtype=object), order.shape[1]))
+        return df
+
+    def nearest(self, name: str, k: int = 10, metric: str = "cosine", weights: dict = None,
+                start: int = 0, mask: np.ndarray = None) -> pd.DataFrame:
+        """Returns the k most similar pokemon to the given one (itself included), sorted by similarity.
+
+        Same columns as `NeighborIndex.nearest`, see `nearest_many` for the arguments.
+        """
+        return self.nearest_many([name], k, metric, weights, start, mask).drop(columns="query")
+
+
+@instrument(cache=st.cache_resource)
+def get_similarity_engine() -> SimilarityEngine:
+    """Returns the similarity engine over the scaled feature matrix. Built once per process."""
     df = load_pokemon_dataframe()
-    umap_df = get_df_with_umap()
+    return SimilarityEngine(df, df[get_feature_columns(df)])
 
-    df["first component"] = umap_df["first component"]
-    df["second component"] = umap_df["second component"]
 
-    # Get the current pokemon embedding
-    current_pokemon = df[df["name"] == pokemon_name][["first component", "second component"]]
+@instrument
+def pokemon_table(pokemon_name: str, k: int = None, metric: str = "umap", weights: dict = None,
+                  start: int = 0, mask: np.ndarray = None) -> pd.DataFrame:
+    """Returns a dataframe with basic information about the pokemon most similar to the current one.
 
-    # Use cosine similarity to get the similarity between the current pokemon and all the others
-    df["similarity"] = 1 - _vectorized_euclidean_distance(df[["first component", "second component"]].to_numpy(),
-                                                          current_pokemon.to_numpy())
+    It adds a column of similarities to the current pokemon, rounded to 4 decimals.
 
-    return df["similarity"]
+    Args:
+        pokemon_name (str): name of the current pokemon.
+        k (int, optional): number of rows to return. Defaults to None (all pokemon).
+        metric (str, optional): one of SIMILARITY_METRICS. Defaults to "umap" (distance in the embedding).
+        weights (dict, optional): weight of each feature group, only used by the "weighted" metric. Defaults to None.
+        start (int, optional): rank of the first row, so pages of the ranking can be requested. Defaults to 0.
+        mask (np.ndarray, optional): boolean mask of the pokemon rows that can be returned (see FacetIndex).
+            Defaults to None (all of them).
+    """
+    index = get_neighbor_index() if metric == "umap" else get_similarity_engine()
+    k = len(index) if k is None else k
+    if metric == "umap":
+        return index.nearest(pokemon_name, k, start=start, mask=mask)
+    return index.nearest(pokemon_name, k, metric=metric, weights=weights, start=start, mask=mask)
 
 
-@st.cache_data
-def pokemon_table(pokemon_df: pd.DataFrame, pokemon_name: str) -> pd.DataFrame:
-    """Returns a dataframe with basic information about all pokemon.
+class PokemonIndex:
+    """Dictionary-backed lookups of pokemon rows by name and by pokedex number.
+
+    Rows are returned as one-row views of the pokemon dataframe selected by position, so no lookup scans a column.
+    Name lookups are case-insensitive.
+    """
 
-    It adds a column of similarities to the current pokemon.
+    def __init__(self, pokemon_df: pd.DataFrame):
+        self.df = pokemon_df
+        self.names = pokemon_df["name"].tolist()
+        self.positions_by_name = {name: i for i, name in enumerate(self.names)}
+        self.positions_by_number = {int(number): i for i, number in enumerate(pokemon_df["pokedex_number"])}
+        self.numbers_by_name = {name.lower(): int(number) for name, number in zip(self.names,
+                                                                                  pokemon_df["pokedex_number"])}
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name: str):
+        return name.lower() in self.numbers_by_name
+
+    def number(self, name: str) -> int:
+        """Returns the pokedex number of the pokemon with the given name."""
+        return self.numbers_by_name[name.lower()]
+
+    def name(self, pokedex_number: int) -> str:
+        """Returns the name of the pokemon with the given pokedex number."""
+        return self.names[self.positions_by_number[pokedex_number]]
+
+    def position(self, name: str) -> int:
+        """Returns the row position of the pokemon with the given name."""
+        position = self.positions_by_name.get(name)
+        if position is None:
+            position = self.positions_by_number[self.number(name)]
+        return position
+
+    def row(self, name: str) -> pd.DataFrame:
+        """Returns the row of the pokemon with the given name as a one-row dataframe."""
+        return self.df.iloc[[self.position(name)]]
+
+    def row_by_number(self, pokedex_number: int) -> pd.DataFrame:
+        """Returns the row of the pokemon with the given pokedex number as a one-row dataframe."""
+        return self.df.iloc[[self.positions_by_number[pokedex_number]]]
+
+
+@instrument(cache=st.cache_resource)
+def get_pokemon_index(columns: tuple = None) -> PokemonIndex:
+    """Returns the name/number index of the pokemon dataframe. Built once per process and set of columns.
 
     Args:
-        pokemon_df (pd.DataFrame): dataframe with pokemon information.
-        pokemon_name (int, optional): pokedex number of the current pokemon. Defaults to 1.
+        columns (tuple, optional): Columns of the indexed rows, must include "name" and "pokedex_number".
+            Defaults to None (all columns).
     """
-    similarities = get_similarities(pokemon_name)
-    df = pokemon_df.copy()
+    return PokemonIndex(load_pokemon_dataframe(columns=columns))
 
-    df["similarity"] = np.round(similarities, 4)
-    # Select columns "name", "type1", "type2", "similarity"
-    df = df[["pokedex_number", "name", "type1", "type2", "similarity"]].rename({"pokedex_number": "#"}, axis=1)
-    # Sort by similarity
-    df = df.sort_values(by="similarity", ascending=False)
-    return df
 
+class PokemonRecord:
+    """The fields of one pokemon shown by the display functions, as plain python values.
 
-@st.cache_data
-def get_pokedex_number(pokemon_df: pd.DataFrame, name: str) -> int:
-    return pokemon_df[pokemon_df["name"] == name]["pokedex_number"].values[0]
+    Records of all the pokemon are built once (see `get_pokemon_records`), so rendering a pokemon reads attributes
+    instead of building and indexing one-row dataframes.
+    """
 
+    __slots__ = ("pokedex_number", "name", "type1", "type2", "height_m", "weight_kg", "abilities", "stats")
 
-@st.cache_data
-def get_pokemon_image(pokedex_number: int):
-    """Returns the image of the pokemon with the given pokedex number."""
-    parent_path = pathlib.Path(__file__).parent
-    # Loop until get to src folder
-    while parent_path.name != "src":
-        parent_path = parent_path.parent
-    parent_path = parent_path.parent.absolute()
+    def __init__(self, pokedex_number: int, name: str, type1: str, type2: str, height_m: float, weight_kg: float,
+                 abilities: tuple, stats: tuple):
+        self.pokedex_number = pokedex_number
+        self.name = name
+        self.type1 = type1
+        # None for single-type pokemon
+        self.type2 = type2
+        self.height_m = height_m
+        self.weight_kg = weight_kg
+        self.abilities = abilities
+        # Base stats in the order of STAT_COLUMNS
+        self.stats = stats
+
+    def __repr__(self):
+        return f"PokemonRecord({self.pokedex_number}, {self.name!r})"
+
+    @classmethod
+    def from_dataframe(cls, pokemon_df: pd.DataFrame) -> list:
+        """Returns the records of every row of the dataframe, in the same order."""
+        type2 = [None if pd.isnull(type_) else type_ for type_ in pokemon_df["type2"].astype(object)]
+        # float32 columns are rounded so they print as in the csv
+        heights = pokemon_df["height_m"].astype(np.float64).round(2).tolist()
+        weights = pokemon_df["weight_kg"].astype(np.float64).round(2).tolist()
+        abilities = [tuple(pokemon_abilities) for pokemon_abilities in pokemon_df["abilities"]]
+        stats = [tuple(row) for row in pokemon_df[STAT_COLUMNS].to_numpy(dtype=int).tolist()]
+        return [cls(*fields) for fields in zip(pokemon_df["pokedex_number"].astype(int).tolist(),
+                                               pokemon_df["name"].tolist(), pokemon_df["type1"].astype(str).tolist(),
+                                               type2, heights, weights, abilities, stats)]
+
+
+@instrument(cache=st.cache_resource)
+def get_pokemon_records() -> list:
+    """Returns the records of all the pokemon, in the order of the pokemon dataframe. Built once per process."""
+    columns = ("pokedex_number", "name", "type1", "type2", "height_m", "weight_kg", "abilities", *STAT_COLUMNS)
+    return PokemonRecord.from_dataframe(load_pokemon_dataframe(columns=columns))
+
+
+def get_pokemon_record(name: str) -> PokemonRecord:
+    """Returns the record of the pokemon with the given name (case-insensitive)."""
+    return get_pokemon_records()[get_pokemon_index(columns=("pokedex_number", "name")).position(name)]
+
+
+class FacetIndex:
+    """Bitset indexes of the pokemon for faceted filtering.
+
+    Every value of the categorical facets (type1, type2, generation, is_legendary) has a bitset of the pokemon rows
+    that have it, packed 8 rows per byte. Stat ranges bisect the sorted values of the stat. A filter ORs the bitsets
+    of the values selected within a facet and ANDs the facets together.
+    """
+
+    def __init__(self, pokemon_df: pd.DataFrame):
+        self.size = len(pokemon_df)
+        self.bitsets = {}
+        for facet in FACET_COLUMNS:
+            values = pokemon_df[facet].to_numpy(dtype=object)
+            self.bitsets[facet] = {value: np.packbits(values == value)
+                                   for value in pd.unique(values) if not pd.isnull(value)}
+        self.sorted_stats = {}
+        for stat in STAT_COLUMNS + ["base_total"]:
+            values = pokemon_df[stat].to_numpy()
+            order = np.argsort(values, kind="stable")
+            self.sorted_stats[stat] = (order, values[order])
+        self.everything = np.packbits(np.ones(self.size, dtype=bool))
+
+    def stat_range(self, stat: str) -> tuple:
+        """Returns the minimum and maximum of the stat."""
+        sorted_values = self.sorted_stats[stat][1]
+        return int(sorted_values[0]), int(sorted_values[-1])
+
+    def values_bitset(self, facet: str, values) -> np.ndarray:
+        """Returns the bitset of the pokemon that have any of the values of the facet."""
+        bitset = np.zeros_like(self.everything)
+        empty = bitset
+        for value in values:
+            bitset = bitset | self.bitsets[facet].get(value, empty)
+        return bitset
+
+    def range_bitset(self, stat: str, low: int = None, high: int = None) -> np.ndarray:
+        """Returns the bitset of the pokemon whose stat is between low and high (both included)."""
+        order, sorted_values = self.sorted_stats[stat]
+        start = 0 if low is None else np.searchsorted(sorted_values, low, side="left")
+        stop = len(sorted_values) if high is None else np.searchsorted(sorted_values, high, side="right")
+        mask = np.zeros(self.size, dtype=bool)
+        mask[order[start:stop]] = True
+        return np.packbits(mask)
+
+    def filter(self, type1=None, type2=None, types=None, generations=None, legendary: bool = None,
+               stat_ranges: dict = None) -> np.ndarray:
+        """Returns a boolean mask of the pokemon rows that match every given facet.
+
+        Args:
+            type1 (list, optional): accepted primary types. Defaults to None (any).
+            type2 (list, optional): accepted secondary types. Defaults to None (any).
+            types (list, optional): accepted types in either slot. Defaults to None (any).
+            generations (list, optional): accepted generations. Defaults to None (any).
+            legendary (bool, optional): True for only legendary pokemon, False for none. Defaults to None (any).
+            stat_ranges (dict, optional): (low, high) range of each stat in STAT_COLUMNS or "base_total".
+                Defaults to None (any).
+        """
+        bitset = self.everything
+        if type1:
+            bitset = bitset & self.values_bitset("type1", type1)
+        if type2:
+            bitset = bitset & self.values_bitset("type2", type2)
+        if types:
+            bitset = bitset & (self.values_bitset("type1", types) | self.values_bitset("type2", types))
+        if generations:
+            bitset = bitset & self.values_bitset("generation", generations)
+        if legendary is not None:
+            bitset = bitset & self.values_bitset("is_legendary", [int(legendary)])
+        for stat, (low, high) in (stat_ranges or {}).items():
+            bitset = bitset & self.range_bitset(stat, low, high)
+        return np.unpackbits(bitset, count=self.size).astype(bool)
+
+
+@instrument(cache=st.cache_resource)
+def get_facet_index() -> FacetIndex:
+    """Returns the bitset indexes of the filter facets. Built once per process."""
+    return FacetIndex(load_pokemon_dataframe(columns=tuple(FACET_COLUMNS + STAT_COLUMNS + ["base_total"])))
+
+
+def get_pokedex_number(name: str) -> int:
+    """Returns the pokedex number of the pokemon with the given name."""
+    return get_pokemon_index().number(name)
+
+
+class AbilityIndex:
+    """Normalized ability table and inverted index from ability to the pokemon that have it.
+
+    `table` has one row per pokemon and ability, with the position ("slot") of the ability in the list of the csv.
+    The csv does not flag hidden abilities, so as in `display_basic_info` the third slot is the hidden one.
+    Searches bisect a sorted list of the lowercase ability names and of every word in them, and fall back to fuzzy
+    matching on an index of character trigrams when no name starts with the query.
+    """
+
+    def __init__(self, pokemon_df: pd.DataFrame):
+        rows = [(int(number), ability, slot)
+                for number, abilities in zip(pokemon_df["pokedex_number"], pokemon_df["abilities"])
+                for slot, ability in enumerate(abilities)]
+        self.table = pd.DataFrame(rows, columns=["pokedex_number", "ability", "slot"])
+        self.table["hidden"] = self.table["slot"] == HIDDEN_ABILITY_SLOT
+
+        pokemon, hidden = {}, {}
+        for number, ability, slot in rows:
+            pokemon.setdefault(ability, set()).add(number)
+            if slot == HIDDEN_ABILITY_SLOT:
+                hidden.setdefault(ability, set()).add(number)
+        self.pokemon = {ability: frozenset(numbers) for ability, numbers in pokemon.items()}
+        self.hidden = {ability: frozenset(hidden.get(ability, ())) for ability in pokemon}
+        self.abilities = sorted(self.pokemon)
+        self.abilities_by_number = {}
+        for number, ability, slot in rows:
+            self.abilities_by_number.setdefault(number, []).append((ability, slot == HIDDEN_ABILITY_SLOT))
+
+        # (lowercase suffix starting at a word, ability) pairs, so "focus" finds "Inner Focus"
+        self._keys = sorted((" ".join(words[i:]), ability)
+                            for ability in self.abilities
+                            for words in [ability.lower().split()]
+                            for i in range(len(words)))
+        self._trigram_counts = {ability: len(_trigrams(ability.lower())) for ability in self.abilities}
+        self._trigrams = {}
+        for ability in self.abilities:
+            for trigram in _trigrams(ability.lower()):
+                self._trigrams.setdefault(trigram, []).append(ability)
+
+    def __len__(self):
+        return len(self.abilities)
+
+    def __contains__(self, ability: str):
+        return ability in self.pokemon
+
+    def pokemon_with(self, ability: str, hidden: bool = None) -> frozenset:
+        """Returns the pokedex numbers of the pokemon with the ability.
+
+        Args:
+            ability (str): name of the ability.
+            hidden (bool, optional): True for only the pokemon that have it as hidden ability, False for only those
+                that do not. Defaults to None (all of them).
+        """
+        numbers = self.pokemon.get(ability, frozenset())
+        if hidden is None:
+            return numbers
+        return self.hidden[ability] if hidden else numbers - self.hidden[ability]
+
+    def abilities_of(self, pokedex_number: int) -> list:
+        """Returns the (ability, hidden) pairs of the pokemon, in the order of the csv."""
+        return self.abilities_by_number.get(pokedex_number, [])
+
+    def search(self, query: str, limit: int = 10) -> list:
+        """Returns the abilities with a word starting with the query, or the closest names if there is none.
+
+        Args:
+            query (str): case-insensitive prefix or approximate name.
+            limit (int, optional): maximum number of abilities. Defaults to 10.
+        """
+        query = " ".join(query.lower().split())
+        if not query:
+            return []
+        matches = []
+        for key, ability in self._keys[bisect.bisect_left(self._keys, (query, "")):]:
+            if not key.startswith(query) or len(matches) == limit:
+                break
+            if ability not in matches:
+                matches.append(ability)
+        if not matches:
+            matches = self._fuzzy_search(query, limit)
+        return matches
+
+    def _fuzzy_search(self, query: str, limit: int) -> list:
+        """Returns the abilities whose trigrams are most similar (Jaccard index) to those of the query."""
+        trigrams = _trigrams(query)
+        shared = collections.Counter()
+        for trigram in trigrams:
+            shared.update(self._trigrams.get(trigram, ()))
+        scores = {ability: count / (len(trigrams) + self._trigram_counts[ability] - count)
+                  for ability, count in shared.items()}
+        ranked = sorted((ability for ability, score in scores.items() if score >= FUZZY_MIN_SCORE),
+                        key=lambda ability: (-scores[ability], ability))
+        return ranked[:limit]
+
+
+def _trigrams(text: str) -> set:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+@instrument(cache=st.cache_resource)
+def get_ability_index() -> AbilityIndex:
+    """Returns the inverted index of abilities. Built once per process."""
+    return AbilityIndex(load_pokemon_dataframe(columns=("pokedex_number", "abilities")))
+
+
+def build_thumbnails(sizes: tuple = THUMBNAIL_SIZES, image_format: str = "webp", force: bool = False) -> int:
+    """Writes downscaled variants of every pokemon image and a manifest to the thumbnails folder.
+
+    Variants are stored as `images/thumbnails/<size>/<pokedex number>.<format>`. The manifest keeps the hash of each
+    source image, so only new or changed images are converted again.
+
+    Args:
+        sizes (tuple, optional): Side lengths in pixels of the variants. Defaults to THUMBNAIL_SIZES.
+        image_format (str, optional): "webp" or "png". Defaults to "webp".
+        force (bool, optional): Convert every image even if it did not change. Defaults to False.
+
+    Returns:
+        int: Number of converted images.
+    """
+    from PIL import Image
+
+    parent_path = get_project_path()
+    thumbnail_path = parent_path / THUMBNAIL_DIR
+    manifest_path = thumbnail_path / "manifest.json"
+    sizes = sorted(sizes)
+
+    old_manifest = {}
+    if manifest_path.exists() and not force:
+        with open(manifest_path) as f:
+            old_manifest = json.load(f)
+    if old_manifest.get("format") != image_format or old_manifest.get("sizes") != sizes:
+        old_manifest = {}
+    old_hashes = old_manifest.get("images", {})
+
+    for size in sizes:
+        (thumbnail_path / str(size)).mkdir(parents=True, exist_ok=True)
+
+    converted = 0
+    hashes = {}
+    for image_path in sorted((parent_path / "images").glob("[0-9][0-9][0-9].png")):
+        pokedex_number = image_path.stem
+        hashes[pokedex_number] = hashlib.sha256(image_path.read_bytes()).hexdigest()
+        if old_hashes.get(pokedex_number) == hashes[pokedex_number]:
+            continue
+        with Image.open(image_path) as image:
+            image.load()
+            for size in sizes:
+                thumbnail = image.copy()
+                thumbnail.thumbnail((size, size), Image.LANCZOS)
+                thumbnail.save(thumbnail_path / str(size) / f"{pokedex_number}.{image_format}", format=image_format)
+        converted += 1
+
+    with open(manifest_path, "w") as f:
+        json.dump({"format": image_format, "sizes": sizes, "images": hashes}, f, indent=4)
+    return converted
+
+
+@instrument(cache=st.cache_resource)
+def get_thumbnail_manifest() -> dict:
+    """Returns the manifest of the thumbnails folder, or an empty manifest if the thumbnails were not built."""
+    try:
+        with open(get_project_path() / THUMBNAIL_DIR / "manifest.json") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"format": None, "sizes": [], "images": {}}
+
+
+def get_pokemon_image_path(pokedex_number: int, size: int = None) -> str:
+    """Returns the path, relative to the project folder, of the image file of the pokemon.
+
+    Args:
+        pokedex_number (int): pokedex number of the pokemon.
+        size (int, optional): Width in pixels the image is rendered at. The smallest thumbnail that is at least that
+            large is chosen, or the full-size image if there is none. Defaults to None (full-size image).
+    """
     pokedex_number = str(pokedex_number).zfill(3)
-    image_path = parent_path / f"images/{pokedex_number}.png"
+    if size is not None:
+        manifest = get_thumbnail_manifest()
+        adequate_sizes = [thumbnail_size for thumbnail_size in manifest["sizes"] if thumbnail_size >= size]
+        if adequate_sizes and pokedex_number in manifest["images"]:
+            return f"{THUMBNAIL_DIR}/{adequate_sizes[0]}/{pokedex_number}.{manifest['format']}"
+    return f"images/{pokedex_number}.png"
+
+
+@instrument(cache=st.cache_data(max_entries=CACHE_MAX_ENTRIES))
+def get_pokemon_image(pokedex_number: int, size: int = None):
+    """Returns the image of the pokemon with the given pokedex number.
+
+    Args:
+        pokedex_number (int): pokedex number of the pokemon.
+        size (int, optional): Width in pixels the image is rendered at. The smallest thumbnail that is at least that
+            large is returned, or the full-size image if there is none. Defaults to None (full-size image).
+    """
+    image_path = get_project_path() / get_pokemon_image_path(pokedex_number, size)
 
     # Read image
+    from PIL import Image
     image = Image.open(image_path)
     return image
 
 
-@st.cache_data
+def get_pokemon_image_url(pokedex_number: int, size: int = None) -> str:
+    """Returns the URL of the image of the pokemon on the image server, see image_server.py.
+
+    The URL is versioned with the hash of the source image, so browsers can cache it forever.
+
+    Args:
+        pokedex_number (int): pokedex number of the pokemon.
+        size (int, optional): Width in pixels the image is rendered at, as in get_pokemon_image. Defaults to None.
+    """
+    image_path = get_pokemon_image_path(pokedex_number, size)
+    version = get_thumbnail_manifest()["images"].get(str(pokedex_number).zfill(3))
+    if version is None:
+        version = str((get_project_path() / image_path).stat().st_mtime_ns)
+    image_server.start(get_project_path() / "images")
+    return image_server.url(image_path.removeprefix("images/"), version[:16])
+
+
+def get_pokemon_image_source(pokedex_number: int, size: int = None):
+    """Returns what st.image should show for the pokemon: its URL if the image server is enabled, else its image."""
+    if image_server.ENABLED:
+        return get_pokemon_image_url(pokedex_number, size)
+    return get_pokemon_image(pokedex_number, size)
+
+
 def get_pokemon_name(pokedex_number: int):
     """Returns the name of the pokemon with the given pokedex number."""
-    # Create a sample dataframe
-    names = {
-        1: "Bulbasaur",
-        2: "Ivysaur",
-        3: "Venusaur",
-        4: "Charmander",
-        5: "Charmeleon",
-    }
-    return names[pokedex_number]
+    return get_pokemon_index().name(pokedex_number)
 
-@st.cache_data
-def get_pokemon_evolution_line(pokemon_name: str):
-    parent_path = pathlib.Path(__file__).parent
-    # Loop until get src folder
-    while parent_path.name != "src":
-        parent_path = parent_path.parent
 
-    evolution_path = parent_path.parent.absolute() / "data/evolutions.csv"
-    df = pd.read_csv(evolution_path)
-
-    # Find the row with the pokemon on any of the columns
-    # Create an empty list to store matching rows
-    matching_rows = []
-
-    # Iterate over each row in the DataFrame
-    for index, row in df.iterrows():
-        # Iterate over each column in the row
-        for column in df.columns:
-            # Check if the search string is present in the cell value
-            if pokemon_name in str(row[column]):
-                # Append the matching row to the list
-                matching_rows.append(row)
-                # Break the inner loop to avoid duplicate rows
-                break
+class EvolutionGraph:
+    """Evolution families keyed by pokedex number.
+
+    Every pokemon is a node with its stage (0: unevolved, 1: first evolution, 2: second evolution) and the base form
+    of its family, so all lookups are dictionary accesses. Pokemon missing from the evolutions csv form a family of
+    their own.
+    """
+
+    def __init__(self, names: dict, stages: dict, bases: dict):
+        self.names = names
+        self.stages = stages
+        self.bases = bases
+
+        members = {base: ([], [], []) for base in set(self.bases.values())}
+        for number in sorted(self.names):
+            members[self.bases[number]][self.stages[number]].append(number)
+        self.families = {base: tuple(tuple(stage) for stage in stages) for base, stages in members.items()}
+
+    @classmethod
+    def from_dataframes(cls, pokemon_df: pd.DataFrame, evolution_df: pd.DataFrame) -> "EvolutionGraph":
+        """Builds the graph from the pokemon dataframe and the rows of the evolutions csv."""
+        numbers = dict(zip(pokemon_df["name"], pokemon_df["pokedex_number"].astype(int)))
+        names = {number: name for name, number in numbers.items()}
+        stages = {number: 0 for number in names}
+        bases = {number: number for number in names}
+
+        rows = [[None if pd.isnull(name) else name for name in row] for row in evolution_df.itertuples(index=False)]
+        rows = cls._join_split_names(rows, numbers)
+        unmatched = sorted({name for row in rows for name in row if name is not None and name not in numbers})
+        if unmatched:
+            logger.debug("%d names of the evolutions csv are not pokemon: %s", len(unmatched), ", ".join(unmatched))
+
+        previous_row = [None, None, None]
+        for row in rows:
+            # A second evolution without first evolution branches from the first evolution of the previous row
+            # (e.g. Oddish -> Gloom -> Bellossom)
+            if row[1] is None and row[2] is not None and row[0] == previous_row[0]:
+                row[1] = previous_row[1]
+            previous_row = row
+
+            base = numbers.get(row[0])
+            if base is None:
+                continue
+            for stage, name in enumerate(row):
+                if name in numbers:
+                    stages[numbers[name]] = stage
+                    bases[numbers[name]] = base
+        return cls(names, stages, bases)
+
+    @staticmethod
+    def _join_split_names(rows: list, numbers: dict) -> list:
+        """Joins the names the evolutions csv splits on spaces over two rows, column by column.
+
+        e.g. the rows `Mime,Mr.,Mr.` and `Jr.,Mime,Rime` are read as `Mime Jr.,Mr. Mime,Mr. Rime`. Two rows are joined
+        when a column of the first one is not a pokemon name and joins with the next row into one.
+        """
+        joined_rows = []
+        i = 0
+        while i < len(rows):
+            row = rows[i]
+            next_row = rows[i + 1] if i + 1 < len(rows) else None
+            if next_row is not None and any(name is not None and name not in numbers and next_name is not None
+                                            and f"{name} {next_name}" in numbers
+                                            for name, next_name in zip(row, next_row)):
+                row = [" ".join(part for part in (name, next_name) if part is not None) or None
+                       for name, next_name in zip(row, next_row)]
+                i += 1
+            joined_rows.append(row)
+            i += 1
+        return joined_rows
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "EvolutionGraph":
+        """Builds the graph from the output of `to_dict` (JSON object keys are strings)."""
+        return cls(*({int(number): value for number, value in data[field].items()}
+                     for field in ("names", "stages", "bases")))
+
+    def to_dict(self) -> dict:
+        return {"names": self.names, "stages": self.stages, "bases": self.bases}
 
-    evolution = pd.DataFrame(matching_rows, columns=df.columns)
+    def base(self, pokedex_number: int) -> int:
+        """Returns the pokedex number of the unevolved form of the family."""
+        return self.bases[pokedex_number]
 
-    # For each column, create a list of all the unique values in the column
-    unique_values = [evolution[column].unique() for column in evolution.columns]
+    def stage(self, pokedex_number: int) -> int:
+        """Returns the evolution stage of the pokemon (0, 1 or 2)."""
+        return self.stages[pokedex_number]
+
+    def stage_members(self, pokedex_number: int, stage: int) -> tuple:
+        """Returns the pokedex numbers of the family members at the given stage."""
+        return self.families[self.bases[pokedex_number]][stage]
+
+    def family(self, pokedex_number: int) -> tuple:
+        """Returns the pokedex numbers of every member of the family, grouped by stage."""
+        return self.families[self.bases[pokedex_number]]
+
+
+def get_evolution_key() -> str:
+    """Returns the key of the evolution index: a hash of the pokemon and evolutions csv files."""
+    sha = hashlib.sha256()
+    for file in (POKEMON_CSV_FILE, EVOLUTIONS_CSV_FILE):
+        sha.update((get_project_path() / file).read_bytes())
+    return sha.hexdigest()
+
+
+def load_evolution_index(key: str):
+    """Returns the stored evolution graph if it was built with the given key, None otherwise."""
+    try:
+        with open(get_project_path() / EVOLUTION_INDEX_FILE) as f:
+            data = json.load(f)
+        if data.get("key") != key:
+            return None
+        return EvolutionGraph.from_dict(data)
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _build_evolution_graph() -> EvolutionGraph:
+    evolution_df = pd.read_csv(get_project_path() / EVOLUTIONS_CSV_FILE)
+    return EvolutionGraph.from_dataframes(load_pokemon_dataframe(columns=("pokedex_number", "name")), evolution_df)
+
+
+def build_evolution_index(force: bool = False) -> bool:
+    """Builds and stores the evolution graph if the stored one is missing or outdated.
+
+    Args:
+        force (bool, optional): Rebuild even if the stored graph is up to date. Defaults to False.
+
+    Returns:
+        bool: Whether the graph was (re)built.
+    """
+    key = get_evolution_key()
+    if not force and load_evolution_index(key) is not None:
+        return False
+    with open(get_project_path() / EVOLUTION_INDEX_FILE, "w") as f:
+        json.dump({"key": key, **_build_evolution_graph().to_dict()}, f)
+    return True
+
+
+@instrument(cache=st.cache_resource)
+def get_evolution_graph() -> EvolutionGraph:
+    """Returns the evolution graph, from the stored index when it is up to date. Built once per process."""
+    graph = load_evolution_index(get_evolution_key())
+    return graph if graph is not None else _build_evolution_graph()
+
+
+@instrument
+def get_pokemon_evolution_line(pokemon_name: str) -> list:
+    """Returns the names of the family members of the pokemon, as one list per stage."""
+    graph = get_evolution_graph()
+    family = graph.family(get_pokemon_index().number(pokemon_name))
+    return [[graph.names[number] for number in stage] for stage in family]
 
-    return unique_values
 
-@st.cache_data
 def get_unevolved(pokemon_name: str):
     return get_pokemon_evolution_line(pokemon_name)[0][0]
 
-@st.cache_data
+
 def get_first_evolved(pokemon_name: str):
     return get_pokemon_evolution_line(pokemon_name)[1]
 
-@st.cache_data
+
 def get_second_evolved(pokemon_name: str):
     return get_pokemon_evolution_line(pokemon_name)[2]
 
 
+class TypeEffectiveness:
+    """Damage multipliers of every attacking type against every pokemon, as a float32 matrix.
+
+    `matrix[i, j]` is the multiplier of POKEMON_TYPES[j] against the pokemon in row i. The 18x18 attack chart
+    (`chart[attacking, defending]`) is derived from the pokemon with a single type.
+    """
+
+    def __init__(self, pokemon_df: pd.DataFrame, matrix: np.ndarray = None):
+        self.types = np.array(POKEMON_TYPES)
+        self.matrix = pokemon_df[AGAINST_COLUMNS].to_numpy(dtype=np.float32) if matrix is None else matrix
+        self.positions = {int(number): i for i, number in enumerate(pokemon_df["pokedex_number"])}
+
+        self.chart = np.ones((len(POKEMON_TYPES), len(POKEMON_TYPES)), dtype=np.float32)
+        single_type = pokemon_df["type2"].isna().to_numpy()
+        type1 = pokemon_df["type1"].astype(str).to_numpy()
+        for j, type_ in enumerate(POKEMON_TYPES):
+            rows = self.matrix[single_type & (type1 == type_)]
+            if len(rows) > 0:
+                self.chart[:, j] = np.median(rows, axis=0)
+
+    def rows(self, pokedex_numbers) -> np.ndarray:
+        """Returns the multipliers against the given pokemon, one row per pokemon."""
+        return self.matrix[[self.positions[int(number)] for number in pokedex_numbers]]
+
+    def bucket_masks(self, pokedex_numbers, multipliers: tuple = DEFENSE_MULTIPLIERS) -> np.ndarray:
+        """Returns a boolean array of shape (pokemon, multipliers, types) telling which types deal each multiplier."""
+        return self.rows(pokedex_numbers)[:, np.newaxis, :] == np.array(multipliers, dtype=np.float32)[:, np.newaxis]
+
+    def defenses(self, pokedex_numbers, multipliers: tuple = DEFENSE_MULTIPLIERS) -> list:
+        """Returns, for each pokemon, a dictionary from multiplier to the types that deal that damage to it."""
+        masks = self.bucket_masks(pokedex_numbers, multipliers)
+        return [{multiplier: self.types[mask].tolist() for multiplier, mask in zip(multipliers, pokemon_masks)}
+                for pokemon_masks in masks]
+
+
+@instrument(cache=st.cache_resource)
+def get_type_effectiveness() -> TypeEffectiveness:
+    """Returns the type effectiveness matrix of every pokemon. Built once per process."""
+    shared_data = get_shared_data()
+    if shared_data is not None:
+        return TypeEffectiveness(load_pokemon_dataframe(columns=("pokedex_number", "type1", "type2")),
+                                 shared_data["effectiveness"])
+    columns = ("pokedex_number", "type1", "type2", *AGAINST_COLUMNS)
+    return TypeEffectiveness(load_pokemon_dataframe(columns=columns))
+
+
+class StatRanks:
+    """Rank and percentile of every stat of every pokemon, among all pokemon, its generation and each of its types.
+
+    Each cohort is sorted once when the index is built, so lookups are array accesses. Ranks count from 1 for the
+    highest value (ties share the best rank). The percentile is the share of the cohort with a lower or equal value.
+    """
+
+    def __init__(self, pokemon_df: pd.DataFrame, values: np.ndarray = None):
+        self.stats = STAT_COLUMNS + ["base_total"]
+        self.stat_positions = {stat: i for i, stat in enumerate(self.stats)}
+        self.positions = {int(number): i for i, number in enumerate(pokemon_df["pokedex_number"])}
+        self.generations = dict(zip(self.positions, pokemon_df["generation"].astype(int)))
+        values = pokemon_df[self.stats].to_numpy(dtype=np.int16) if values is None else values
+
+        members = {"all": np.ones(len(pokemon_df), dtype=bool)}
+        generation = pokemon_df["generation"].to_numpy()
+        for value in np.unique(generation):
+            members[("generation", int(value))] = generation == value
+        type1 = pokemon_df["type1"].to_numpy(dtype=object)
+        type2 = pokemon_df["type2"].to_numpy(dtype=object)
+        for type_ in POKEMON_TYPES:
+            members[("type", type_)] = (type1 == type_) | (type2 == type_)
+
+        # Pokemon outside a cohort have rank 0 and percentile NaN
+        self.ranks = {}
+        self.percentiles = {}
+        for cohort, mask in members.items():
+            ranks = np.zeros(values.shape, dtype=np.int16)
+            percentiles = np.full(values.shape, np.nan, dtype=np.float32)
+            cohort_values = values[mask]
+            sorted_values = np.sort(cohort_values, axis=0)
+            for j in range(len(self.stats)):
+                at_or_below = np.searchsorted(sorted_values[:, j], cohort_values[:, j], side="right")
+                ranks[mask, j] = len(cohort_values) - at_or_below + 1
+                percentiles[mask, j] = 100 * at_or_below / len(cohort_values)
+            self.ranks[cohort] = ranks
+            self.percentiles[cohort] = percentiles
+        self.cohort_sizes = {cohort: int(mask.sum()) for cohort, mask in members.items()}
+
+    def _cohort(self, pokedex_number: int, cohort):
+        """Returns the key of a cohort: "all", "generation" (the pokemon's own), a type name or a (facet, value)."""
+        if cohort == "generation":
+            return "generation", self.generations[pokedex_number]
+        if cohort in POKEMON_TYPES:
+            return "type", cohort
+        return cohort
+
+    def rank(self, pokedex_number: int, stat: str, cohort="all") -> int:
+        """Returns the rank of the stat of the pokemon in the cohort, or 0 if the pokemon is not part of it.
+
+        Args:
+            pokedex_number (int): pokedex number of the pokemon.
+            stat (str): one of STAT_COLUMNS or "base_total".
+            cohort (str, optional): "all", "generation" (the generation of the pokemon) or a type. Defaults to "all".
+        """
+        key = self._cohort(pokedex_number, cohort)
+        return int(self.ranks[key][self.positions[pokedex_number], self.stat_positions[stat]])
+
+    def percentile(self, pokedex_number: int, stat: str, cohort="all") -> float:
+        """Returns the percentile of the stat of the pokemon in the cohort (NaN if it is not part of it).
+
+        See `rank` for the arguments.
+        """
+        key = self._cohort(pokedex_number, cohort)
+        return float(self.percentiles[key][self.positions[pokedex_number], self.stat_positions[stat]])
+
+    def cohort_size(self, pokedex_number: int, cohort="all") -> int:
+        """Returns the number of pokemon in the cohort."""
+        return self.cohort_sizes[self._cohort(pokedex_number, cohort)]
+
+    def stat_percentiles(self, pokedex_number: int, cohort="all") -> np.ndarray:
+        """Returns the percentiles of every stat (in the order of `stats`) of the pokemon in the cohort."""
+        key = self._cohort(pokedex_number, cohort)
+        return self.percentiles[key][self.positions[pokedex_number]]
+
+
+@instrument(cache=st.cache_resource)
+def get_stat_ranks() -> StatRanks:
+    """Returns the stat ranks and percentiles of every pokemon. Built once per process."""
+    shared_data = get_shared_data()
+    if shared_data is not None:
+        return StatRanks(load_pokemon_dataframe(columns=("pokedex_number", "generation", "type1", "type2")),
+                         shared_data["stats"])
+    columns = ("pokedex_number", "generation", "type1", "type2", *STAT_COLUMNS, "base_total")
+    return StatRanks(load_pokemon_dataframe(columns=columns))
+
+
+def _get_shared_data_key() -> dict:
+    """Returns the keys the published matrices must match: the pokemon csv hash and the UMAP key."""
+    return {"pokemon_csv_sha256": get_pokemon_csv_hash(), "umap_key": get_umap_key()}
+
+
+def publish_shared_data(directory) -> dict:
+    """Writes the numeric matrices to the directory, for worker processes to memory-map them (see `get_shared_data`).
+
+    Every matrix is written to a temporary file and renamed, and the manifest is written last, so workers never
+    attach to a partially written set. Use a tmpfs directory (e.g. /dev/shm/pokedex) so the pages live in memory.
+
+    Args:
+        directory (str or pathlib.Path): directory to write to, created if needed.
+
+    Returns:
+        dict: the manifest, with the shape and dtype of every matrix.
+    """
+    directory = pathlib.Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    pokemon_df = load_pokemon_dataframe(columns=(*STAT_COLUMNS, "base_total", *AGAINST_COLUMNS))
+    embedding = _load_or_fit_umap_embedding()
+    arrays = load_neighbor_arrays(get_embedding_hash(embedding))
+    if arrays is None:
+        index = NeighborIndex.from_embedding(load_pokemon_dataframe(columns=("pokedex_number", "name", "type1",
+                                                                             "type2")), embedding)
+        arrays = index.order, index.similarities
+    matrices = {
+        "stats": pokemon_df[STAT_COLUMNS + ["base_total"]].to_numpy(dtype=np.int16),
+        "effectiveness": pokemon_df[AGAINST_COLUMNS].to_numpy(dtype=np.float32),
+        "embedding": np.asarray(embedding, dtype=np.float64),
+        "neighbor_order": arrays[0].astype(np.int16),
+        "neighbor_similarities": arrays[1].astype(np.float32),
+    }
+
+    manifest = {**_get_shared_data_key(), "published": time.time(), "matrices": {}}
+    for name, matrix in matrices.items():
+        tmp_path = directory / f"{name}.npy.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, np.ascontiguousarray(matrix))
+        os.replace(tmp_path, directory / f"{name}.npy")
+        manifest["matrices"][name] = {"shape": list(matrix.shape), "dtype": str(matrix.dtype)}
+    tmp_path = directory / (SHARED_MANIFEST_FILE + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=4)
+    os.replace(tmp_path, directory / SHARED_MANIFEST_FILE)
+    return manifest
+
+
+@instrument(cache=st.cache_resource)
+def get_shared_data():
+    """Returns the published matrices as read-only memory maps, None if they are not published or outdated.
+
+    Set POKEDEX_SHARED_DATA_DIR to the directory a loader process published them to. Every worker process then
+    maps the same pages instead of building its own copies, and never refits UMAP.
+    """
+    if SHARED_DATA_DIR is None:
+        return None
+    directory = pathlib.Path(SHARED_DATA_DIR)
+    try:
+        with open(directory / SHARED_MANIFEST_FILE) as f:
+            manifest = json.load(f)
+        if any(manifest.get(name) != key for name, key in _get_shared_data_key().items()):
+            return None
+        return {name: np.load(directory / f"{name}.npy", mmap_mode="r") for name in manifest["matrices"]}
+    except (OSError, ValueError, KeyError):
+        return None
+
 
 
 
 if __name__ == "__main__":
+    import plotly
+
     df = load_pokemon_dataframe()
     plot = pokemon_umap(color_by="pop-out")
     # Show scatter plot not in streamlit
@@ -0,0 +1,7 @@
+import pathlib
+import sys
+
+# Make the dashboard modules and the scripts importable
+PROJECT_PATH = pathlib.Path(__file__).parent.parent.absolute()
+sys.path.append(str(PROJECT_PATH / "src"))
+sys.path.append(str(PROJECT_PATH / "scripts"))
@@ -0,0 +1,45 @@
+import random
+import threading
+import time
+
+import pandas as pd
+
+import utils
+
+COLUMN_SUBSETS = [("name", "type1"), ("hp", "attack", "name"), ("speed", "generation"), ("abilities", "type2"),
+                  ("against_fire", "hp"), ("weight_kg", "height_m", "speed"), None, ("is_legendary", "base_total")]
+N_THREADS = 16
+
+
+def test_frame_loads_column_subsets_concurrently(monkeypatch):
+    # Slow down column lookups, so loads take long enough for other threads to start while they update the dataset
+    getitem = pd.DataFrame.__getitem__
+
+    def slow_getitem(self, key):
+        time.sleep(1e-4)
+        return getitem(self, key)
+
+    monkeypatch.setattr(pd.DataFrame, "__getitem__", slow_getitem)
+    n_rows = len(utils.read_pokemon_dataframe(columns=("name",)))
+    rng = random.Random(0)
+    for _ in range(5):
+        dataset = utils.PokemonDataset()
+        errors = []
+
+        def load(delay, subsets):
+            time.sleep(delay)
+            try:
+                for columns in subsets:
+                    df = dataset.frame(columns)
+                    assert list(df.columns) == list(columns or dataset.column_names)
+                    assert len(df) == n_rows
+            except Exception as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=load, args=(rng.uniform(0, 0.02), rng.sample(COLUMN_SUBSETS, 3)))
+                   for _ in range(N_THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert errors == []
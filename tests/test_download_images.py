@@ -0,0 +1,61 @@
+import json
+
+import pytest
+import requests
+
+import download_images
+
+PNG = download_images.PNG_SIGNATURE + b"image"
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, content: bytes = b""):
+        self.status_code = status_code
+        self.content = content
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} error", response=self)
+
+
+class FakeSession:
+    """Answers with the given status code for each file name, and a PNG otherwise."""
+
+    def __init__(self, status_codes: dict = None):
+        self.status_codes = status_codes or {}
+        self.calls = []
+
+    def get(self, url, timeout=None):
+        name = url.rsplit("/", 1)[-1]
+        self.calls.append(name)
+        status_code = self.status_codes.get(name, 200)
+        return FakeResponse(status_code, PNG if status_code == 200 else b"")
+
+    def close(self):
+        pass
+
+
+@pytest.mark.parametrize("status_code, calls", [(404, 1), (403, 1), (429, 3), (503, 3)])
+def test_only_transient_errors_are_retried(tmp_path, status_code, calls):
+    session = FakeSession({"001.png": status_code})
+    with pytest.raises(requests.HTTPError):
+        download_images.download(session, "http://test/001.png", tmp_path / "001.png", retries=2, backoff=0)
+    assert len(session.calls) == calls
+
+
+def test_write_errors_are_reported_and_the_run_goes_on(tmp_path, monkeypatch):
+    write_atomically = download_images.write_atomically
+
+    def failing_write(path, content):
+        if path.name == "002.png":
+            raise OSError("No space left on device")
+        write_atomically(path, content)
+
+    monkeypatch.setattr(download_images, "write_atomically", failing_write)
+    monkeypatch.setattr(download_images, "create_session", lambda workers: FakeSession({"003.png": 404}))
+    counts = download_images.download_images("http://test/", tmp_path, first=1, last=5, workers=2, retries=1,
+                                             backoff=0)
+
+    assert counts == {"downloaded": 3, "skipped": 0, "failed": 2}
+    with open(tmp_path / download_images.MANIFEST_FILE) as f:
+        assert sorted(json.load(f)) == ["001.png", "004.png", "005.png"]
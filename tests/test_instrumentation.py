@@ -0,0 +1,45 @@
+import pickle
+import time
+
+import instrumentation
+import utils
+
+
+def test_payload_size_of_figure_matches_serialized_size():
+    figure = utils.get_base_umap_figure("type")
+    serialized_size = len(pickle.dumps(figure))
+    assert serialized_size / 2 <= instrumentation._payload_size(figure) <= serialized_size * 4
+
+
+def test_payload_size_counts_attributes_of_index_objects():
+    index = utils.get_neighbor_index()
+    assert instrumentation._payload_size(index) >= index.order.nbytes + index.similarities.nbytes
+    records = utils.get_pokemon_records()
+    assert instrumentation._payload_size(records) >= len(pickle.dumps(records))
+
+
+def test_payload_size_of_dataframes_and_series():
+    df = utils.load_pokemon_dataframe(columns=("name", "hp"))
+    assert instrumentation._payload_size(df["hp"]) >= df["hp"].to_numpy().nbytes
+    assert instrumentation._payload_size(df) > instrumentation._payload_size(df["hp"])
+
+
+def test_rerun_total_counts_nested_calls_once(monkeypatch):
+    monkeypatch.setattr(instrumentation, "ENABLED", True)
+
+    @instrumentation.instrument
+    def inner():
+        time.sleep(0.02)
+
+    @instrumentation.instrument
+    def outer():
+        inner()
+        time.sleep(0.02)
+
+    instrumentation.start_rerun("test")
+    start = time.perf_counter()
+    outer()
+    wall_s = time.perf_counter() - start
+    rerun = instrumentation.get_stats()["reruns"][-1]
+    assert rerun["functions"][f"{__name__}.test_rerun_total_counts_nested_calls_once.<locals>.inner"]["calls"] == 1
+    assert 0.04 <= rerun["total_s"] <= wall_s
@@ -0,0 +1,18 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import utils
+
+
+@pytest.mark.parametrize("metric", utils.SIMILARITY_METRICS)
+def test_pokemon_table_has_the_same_layout_for_every_metric(metric):
+    df = utils.pokemon_table("Pikachu", k=20, metric=metric, start=20)
+    assert list(df.columns) == ["#", "name", "type1", "type2", "similarity"]
+    pd.testing.assert_index_equal(df.index, pd.RangeIndex(20))
+    assert np.all(np.diff(df["similarity"].to_numpy()) <= 0)
+
+
+def test_pokemon_table_starts_with_the_pokemon_itself():
+    for metric in utils.SIMILARITY_METRICS:
+        assert utils.pokemon_table("Pikachu", k=1, metric=metric)["name"].iloc[0] == "Pikachu"
@@ -0,0 +1,26 @@
+import numpy as np
+
+import utils
+
+
+def _percentile(df, cohort, pokedex_number, stat):
+    value = df.loc[df["pokedex_number"] == pokedex_number, stat].iloc[0]
+    return 100 * (cohort[stat] <= value).sum() / len(cohort)
+
+
+def test_type_cohort_of_dual_type_pokemon_has_its_type_in_either_slot():
+    df = utils.load_pokemon_dataframe(columns=("pokedex_number", "type1", "type2", *utils.STAT_COLUMNS))
+    stat_ranks = utils.get_stat_ranks()
+    charizard = 6  # fire / flying
+    fire = df[(df["type1"] == "fire") | (df["type2"] == "fire")]
+    percentiles = stat_ranks.stat_percentiles(charizard, "fire")[:len(utils.STAT_COLUMNS)]
+    expected = [_percentile(df, fire, charizard, stat) for stat in utils.STAT_COLUMNS]
+    np.testing.assert_allclose(percentiles, expected, rtol=1e-5)
+    assert stat_ranks.cohort_size(charizard, "fire") == len(fire)
+
+
+def test_generation_cohort():
+    df = utils.load_pokemon_dataframe(columns=("pokedex_number", "generation", "hp"))
+    stat_ranks = utils.get_stat_ranks()
+    generation = df[df["generation"] == 1]
+    assert stat_ranks.percentile(6, "hp", "generation") == np.float32(_percentile(df, generation, 6, "hp"))
@@ -0,0 +1,18 @@
+import pytest
+
+from team import suggest_team
+
+
+@pytest.mark.parametrize("team_names", [["Pikachu", "Pikachu"], ["Pikachu", "pikachu"], ["Bulbasaur", "Mew", "MEW"]])
+def test_repeated_members_are_rejected(team_names):
+    with pytest.raises(ValueError):
+        suggest_team(team_names)
+
+
+def test_suggestions_fill_the_free_slots():
+    suggestions = suggest_team(["Pikachu", "Charizard"], n_suggestions=3)
+    assert len(suggestions) == 3
+    for team in suggestions["team"]:
+        members = team.split(", ")
+        assert len(members) == 6 and len(set(members)) == 6
+        assert members[:2] == ["Pikachu", "Charizard"]